@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# compression ratio and throughput of one shared table against adaptive per block tables on a log mixing different kinds of content
+# usage: py benchmarks/bench_adaptive.py [size in MB] [section size in KB]
+
+import base64
+import json
+import os.path
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huffman_engine as engine
+from nipzip import BasicLogger
+
+BLOCK_SIZES = [1 << 14, 1 << 16, 1 << 18]
+
+def json_section(rand, size):
+    out, length = [], 0
+
+    while length < size:
+        line = json.dumps({"ts": rand.randrange(10**9), "level": rand.choice(["info", "debug"]), "user": rand.randrange(10**4), "path": rand.choice(["/api/items", "/api/users", "/login"])}) + "\n"
+        out.append(line)
+        length += len(line)
+
+    return "".join(out)
+
+def trace_section(rand, size):
+    out, length = [], 0
+
+    while length < size:
+        line = f'  File "/srv/app/{rand.choice(["views", "models", "db", "cache"])}.py", line {rand.randrange(1000)}, in {rand.choice(["handle", "save", "query", "get"])}\n'
+        out.append(line)
+        length += len(line)
+
+    return "Traceback (most recent call last):\n" + "".join(out)
+
+def base64_section(rand, size):
+    return base64.encodebytes(rand.randbytes(size * 3 // 4)).decode()
+
+def corpus(path, size, section): # deterministic log whose character distribution changes every section
+    rand = random.Random(size)
+    kinds = [json_section, trace_section, base64_section]
+
+    with open(path, "w") as f:
+        written = 0
+
+        while written < size:
+            text = rand.choice(kinds)(rand, section)
+            f.write(text)
+            written += len(text)
+
+def run(src, dest, **options):
+    start = time.perf_counter()
+    engine.compress(src, dest, **options)
+    elapsed = time.perf_counter() - start
+
+    # checks the round trip, sequentially and through the index
+    out = dest + ".txt"
+    engine.decompress(dest, out)
+    engine.decompress(dest, out + "2", jobs=2)
+
+    with open(src) as a, open(out) as b, open(out + "2") as c:
+        text = a.read()
+        assert text == b.read() == c.read(), "round trip doesn't match"
+
+    return os.path.getsize(src) / os.path.getsize(dest), elapsed
+
+def main(size, section):
+    engine.logger = BasicLogger()
+    engine.verbose = False
+    engine.override = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "corpus.txt")
+        corpus(src, size * 2**20, section * 2**10)
+
+        print(f"{size} MB, sections of {section} KB (json / stack traces / base64)")
+        print(f"{'':<22} {'ratio':>7} {'time':>8} {'MB/s':>7}")
+
+        def report(name, ratio, elapsed):
+            print(f"{name:<22} {ratio:>7.3f} {elapsed:>7.2f}s {size/elapsed:>7.2f}")
+
+        report("whole file", *run(src, os.path.join(tmp, "whole.bin")))
+
+        for block_size in BLOCK_SIZES:
+            report(f"shared, blocks {block_size >> 10}K", *run(src, os.path.join(tmp, f"s{block_size}.bin"), chunk_size=block_size))
+            report(f"adaptive, blocks {block_size >> 10}K", *run(src, os.path.join(tmp, f"a{block_size}.bin"), chunk_size=block_size, adaptive=True))
+
+            # workers forked after the files above were compressed in this process, so they mustn't reuse those tables
+            report(f"adaptive, 2 jobs, {block_size >> 10}K", *run(src, os.path.join(tmp, f"a{block_size}j.bin"), chunk_size=block_size, adaptive=True, jobs=2))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 16, int(sys.argv[2]) if len(sys.argv) > 2 else 256)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# wall time of compressing a directory of many small files with one nipzip.py process per file against --recursive
+# the per process time is measured on a sample of the files and scaled up to all of them
+# usage: py benchmarks/bench_batch.py [files] [jobs]
+
+import os.path
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huffman_engine as engine
+
+NIPZIP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nipzip.py")
+WORDS = ["error", "request", "user", "timeout", "GET", "POST", "/api/items", "200", "404", "ms", "session", "cache"]
+
+def write_files(folder, amount): # deterministic log files of roughly 1-20 KB spread over a few directories
+    rand = random.Random(amount)
+
+    for i in range(amount):
+        path = os.path.join(folder, f"d{i % 10}", f"{i}.txt")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "w") as f:
+            for _ in range(rand.randrange(20, 400)):
+                f.write(" ".join(rand.choice(WORDS) for _ in range(8)) + "\n")
+
+def main(amount, jobs):
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "files")
+        write_files(folder, amount)
+
+        paths = sorted(os.path.join(root, name) for root, _, names in os.walk(folder) for name in names)
+        sample = paths[:min(len(paths), 50)]
+
+        start = time.perf_counter()
+        for path in sample:
+            subprocess.run([sys.executable, NIPZIP, "--source", path, "-o"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        per_file = (time.perf_counter() - start) / len(sample)
+
+        print(f"{amount} files, {sum(map(os.path.getsize, paths)) / amount / 1024:.1f} KB on average")
+        print(f"{'process per file':<24} {per_file * amount:>8.2f}s (estimated from {len(sample)} files)")
+
+        for name, options in [("recursive, 1 job", {"jobs": 1}), (f"recursive, {jobs} jobs", {"jobs": jobs, "force": True}), ("recursive, up to date", {"jobs": jobs})]:
+            report = engine.compress_dir(folder, **options)
+            print(f"{name:<24} {report.seconds:>8.2f}s ({report.compressed} compressed, {report.skipped} up to date)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count())
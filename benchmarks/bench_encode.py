@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# times the vectorized numpy encoder against the pure python bit writer and checks both write identical .bin files
+# usage: py benchmarks/bench_encode.py [size in characters]
+
+import os.path
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huffman_engine as engine
+import huffman_io_engine as io
+from nipzip import BasicLogger
+
+def corpus(size): # deterministic mixed text, mostly ascii words with some unicode
+    rand = random.Random(size)
+    words = ["the", "huffman", "tree", "of", "code", "nipzip", "data", "é", "€", "文字", "\n", "0x1f", "{}"]
+
+    out, length = [], 0
+    while length < size:
+        out.append(rand.choice(words) + " ")
+        length += len(out[-1])
+
+    return "".join(out)[:size]
+
+def timed(func, *args):
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+def main(size):
+    engine.logger = BasicLogger()
+    engine.verbose = False
+    engine.override = True
+
+    string = corpus(size)
+
+    tree = engine.Tree(string)
+    tree.build_tree()
+
+    char_map = engine._canonical_map(tree)
+
+    python, python_time = timed(io._pack_codes, string, char_map)
+    vector, vector_time = timed(engine.Code_arrays(char_map).pack, string)
+    assert python == vector, "encoders disagree"
+
+    mb = len(string.encode("utf-8")) / 2**20
+    print(f"payload encode, {size} characters")
+    print(f"    python: {python_time:.3f}s ({mb/python_time:.1f} MB/s)")
+    print(f"    numpy:  {vector_time:.3f}s ({mb/vector_time:.1f} MB/s)")
+
+    # full .bin output, whole file and in blocks, from both encoders
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "corpus.txt")
+
+        with open(src, "w") as f:
+            f.write(string)
+
+        for chunk_size in (None, 4096):
+            outputs = []
+
+            for vectorize in (False, True):
+                dest = os.path.join(tmp, f"{vectorize}_{chunk_size}.bin")
+                engine.compress(src, dest, chunk_size, vectorize)
+
+                with open(dest, "rb") as f:
+                    outputs.append(f.read())
+
+            assert outputs[0] == outputs[1], ".bin outputs differ"
+
+        print("all .bin outputs identical")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# compression cost against decode speed for different code length limits on a skewed distribution
+# usage: py benchmarks/bench_max_len.py [size in characters]
+
+import os.path
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huffman_engine as engine
+import huffman_io_engine as io
+
+LIMITS = [None, 24, 15, 12, 10]
+
+def corpus(size): # geometric distribution over 400 symbols, like telemetry with a long tail of rare values
+    rand = random.Random(size)
+    symbols = [chr(0x100 + i) for i in range(400)]
+    weights = [0.75 ** i for i in range(400)]
+
+    text = rand.choices(symbols, weights, k=size)
+    return "".join(symbols + text) # every symbol at least once
+
+def table_slots(table): # lookup table entries, including overflow subtables
+    return len(table.sym) + sum(table_slots(sub) for sub in table.sym if isinstance(sub, io.Decode_table))
+
+def main(size):
+    string = corpus(size)
+
+    tree = engine.Tree(string)
+    tree.build_tree()
+
+    base = None
+    print(f"{'limit':>6} {'max len':>8} {'bits/char':>10} {'cost':>8} {'slots':>7} {'decode':>10}")
+
+    for limit in LIMITS:
+        char_map = engine._canonical_map(tree, limit)
+        text_bits = engine._text_bits(tree.table, char_map)
+        base = base or text_bits
+
+        writer = io.Bit_writer()
+        writer.write_codes(string, char_map)
+        data = writer.flush()
+
+        start = time.perf_counter()
+        table = io.Decode_table(char_map)
+        text = io.Bit_reader().decode(table, data, pad=len(data)*8 - text_bits)
+        elapsed = time.perf_counter() - start
+
+        assert text == string, "decoded text differs"
+        print(f"{str(limit):>6} {engine._max_code_len(char_map):>8} {text_bits/len(string):>10.4f} {100*(text_bits/base - 1):>7.2f}% {table_slots(table):>7} {elapsed:>9.3f}s")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# peak memory and wall time of compressing and decompressing with memory mapped files against buffered reads and writes
+# every run is a fresh process so peak memory isn't carried over from the previous one
+# usage: py benchmarks/bench_mmap.py [size in MB]
+
+import os.path
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huffman_engine as engine
+from nipzip import BasicLogger
+
+def corpus(path, size): # deterministic bytes with a skewed distribution, like a binary file
+    rand = random.Random(size)
+    weights = [rand.expovariate(1) ** 3 for _ in range(256)]
+
+    with open(path, "wb") as f:
+        for _ in range(0, size, 1 << 20):
+            f.write(bytes(rand.choices(range(256), weights, k=1 << 20)))
+
+def child(action, infile, outfile, use_mmap): # runs in its own process, prints peak memory in KB and wall time
+    engine.logger = BasicLogger()
+    engine.verbose = False
+    engine.override = True
+
+    start = time.perf_counter()
+
+    if action == "compress":
+        engine.compress(infile, outfile, binary=True, use_mmap=use_mmap)
+    else:
+        engine.decompress(infile, outfile, use_mmap=use_mmap)
+
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, time.perf_counter() - start)
+
+def run(*args):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", *map(str, args)], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    rss, elapsed = out.stdout.split()[-2:]
+    return int(rss), float(elapsed)
+
+def main(size):
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "corpus.dat")
+        corpus(src, size * 2**20)
+
+        print(f"{size} MB of bytes")
+        print(f"{'':<12} {'mmap':>20} {'buffered':>20}")
+
+        for action, infile, outfile in [("compress", src, src + ".bin"), ("decompress", src + ".bin", src + ".out")]:
+            results = []
+
+            for use_mmap in (1, 0):
+                rss, elapsed = run(action, infile, outfile, use_mmap)
+                results.append(f"{rss/1024:>8.1f} MB {elapsed:>7.2f}s")
+
+            print(f"{action:<12}", *results)
+
+        with open(src, "rb") as a, open(src + ".out", "rb") as b:
+            assert a.read() == b.read(), "round trip doesn't match"
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5] == "1")
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 64)
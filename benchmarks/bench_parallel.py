@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# compression and decompression throughput in blocks with 1 to N worker processes
+# usage: py benchmarks/bench_parallel.py [size in MB] [max jobs]
+
+import os.path
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huffman_engine as engine
+from nipzip import BasicLogger
+
+def corpus(path, size): # deterministic log like text
+    rand = random.Random(size)
+    words = ["INFO", "WARN", "ERROR", "request", "user", "id=", "took", "ms", "GET", "/api/v1/items", "200", "404", "\n"]
+
+    with open(path, "w") as f:
+        written = 0
+
+        while written < size:
+            line = " ".join(rand.choice(words) for _ in range(12)) + f" {rand.randrange(10**6)}\n"
+            f.write(line)
+            written += len(line)
+
+def main(size, max_jobs):
+    engine.logger = BasicLogger()
+    engine.verbose = False
+    engine.override = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "corpus.txt")
+        corpus(src, size * 2**20)
+
+        print(f"{size} MB, {os.cpu_count()} cpu(s), blocks of {engine.DEFAULT_BLOCK_SIZE // 4} characters")
+        print(f"{'':>5} {'compress':^26} {'decompress':^26}")
+        print(f"{'jobs':>5}" + f" {'time':>9} {'MB/s':>7} {'speedup':>8}" * 2)
+
+        bases = None
+        for jobs in range(1, max_jobs + 1):
+            binfile = os.path.join(tmp, f"{jobs}.bin")
+            times = []
+
+            start = time.perf_counter()
+            engine.compress(src, binfile, engine.DEFAULT_BLOCK_SIZE // 4, jobs=jobs)
+            times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            engine.decompress(binfile, os.path.join(tmp, f"{jobs}.txt"), jobs=jobs)
+            times.append(time.perf_counter() - start)
+
+            bases = bases or times
+            print(f"{jobs:>5}" + "".join(f" {t:>8.2f}s {size/t:>7.2f} {base/t:>7.2f}x" for t, base in zip(times, bases)))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32, int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# size and time of compressing many small messages with a table each against a shared table trained on similar messages
+# usage: py benchmarks/bench_shared.py [messages] [training messages]
+
+import json
+import os.path
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huffman_engine as engine
+from nipzip import BasicLogger
+
+def message(rand): # json event message of roughly 1-4 KB
+    events = [{"t": rand.randrange(10**6), "kind": rand.choice(["click", "view", "buy"]), "path": f"/p/{rand.randrange(1000)}"} for _ in range(rand.randrange(10, 50))]
+    return json.dumps({"id": rand.randrange(10**9), "user": rand.choice(["alice", "bob", "carol"]), "events": events})
+
+def write_messages(folder, amount, seed):
+    rand = random.Random(seed)
+    os.makedirs(folder)
+
+    paths = []
+    for i in range(amount):
+        paths.append(os.path.join(folder, f"{i}.txt"))
+
+        with open(paths[-1], "w") as f:
+            f.write(message(rand))
+
+    return paths
+
+def run(paths, tmp, table=None): # compresses and decompresses every message, returns total compressed size and time for each
+    size = compress_time = decompress_time = 0
+
+    for path in paths:
+        dest = os.path.join(tmp, "out.bin")
+
+        start = time.perf_counter()
+        engine.compress(path, dest, table=table)
+        compress_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        engine.decompress(dest, dest + ".txt", table=table)
+        decompress_time += time.perf_counter() - start
+
+        with open(path) as a, open(dest + ".txt") as b:
+            assert a.read() == b.read(), "round trip doesn't match"
+
+        size += os.path.getsize(dest)
+
+    return size, compress_time, decompress_time
+
+def main(amount, training):
+    engine.logger = BasicLogger()
+    engine.verbose = False
+    engine.override = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        samples = os.path.join(tmp, "samples")
+        write_messages(samples, training, 0)
+        paths = write_messages(os.path.join(tmp, "messages"), amount, 1)
+
+        start = time.perf_counter()
+        table = engine.train(samples, os.path.join(tmp, "table.nzt"))
+        print(f"trained on {training} messages in {time.perf_counter() - start:.2f}s, table file: {len(table.data)} bytes")
+
+        original = sum(map(os.path.getsize, paths))
+        print(f"{amount} messages, {original / amount:.0f} bytes on average")
+        print(f"{'':<14} {'size':>9} {'ratio':>7} {'compress':>12} {'decompress':>12}")
+
+        for name, table_file in [("own tables", None), ("shared table", table)]:
+            size, compress_time, decompress_time = run(paths, tmp, table_file)
+            print(f"{name:<14} {size:>9} {original/size:>7.3f} {1000*compress_time/amount:>9.2f} ms {1000*decompress_time/amount:>9.2f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500, int(sys.argv[2]) if len(sys.argv) > 2 else 200)
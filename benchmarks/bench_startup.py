@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# startup cost of nipzip.py: the import time of nipzip and the engine from python -X importtime, and the wall time of short commands
+# every number is the best of several runs, after one run to write the .pyc files so compiling isn't counted
+# bench_suite.py saves these with its results, so a module creeping back into the imports shows up against the baseline
+# usage: py benchmarks/bench_startup.py [runs], with python 3.7 or newer for -X importtime
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NIPZIP = os.path.join(ROOT, "nipzip.py")
+HEAVY = ("numpy", "concurrent.futures", "hashlib", "json", "cProfile", "traceback") # modules that should only be loaded when they're used
+
+def _env():
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+def import_time(runs=5):
+    # microseconds nipzip takes to import (with everything it imports), and the modules in HEAVY it loaded
+    best, loaded = None, set()
+
+    for _ in range(runs + 1):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import nipzip"], cwd=ROOT, env=_env(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        times = {}
+
+        for line in out.stderr.splitlines(): # import time: self [us] | cumulative | imported package
+            if line.startswith("import time:") and "|" in line and not line.endswith("imported package"):
+                _, cumulative, name = line[len("import time:"):].split("|")
+                times[name.strip()] = int(cumulative)
+
+        loaded = {name for name in HEAVY if name in times}
+        best = times["nipzip"] if best is None else min(best, times["nipzip"])
+
+    return best, sorted(loaded)
+
+def command_time(args, runs=5): # best wall time in seconds of nipzip.py with args
+    best = float("inf")
+
+    for _ in range(runs + 1):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, NIPZIP, *args], env=_env(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+def measure(runs=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "small.txt")
+        with open(path, "w") as f:
+            f.write("a short file of the kind most commands are run on\n" * 40)
+
+        import_us, loaded = import_time(runs)
+
+        return {
+            "import_ms": import_us / 1000,
+            "heavy_imports": loaded,
+            "help_ms": 1000 * command_time(["-h"], runs),
+            "compress_small_ms": 1000 * command_time(["--source", path, "-o"], runs),
+            "decompress_small_ms": 1000 * command_time(["--source", os.path.join(tmp, "small.bin"), "--dest", path, "-o"], runs),
+        }
+
+def main(runs):
+    result = measure(runs)
+
+    print(f"import nipzip          {result['import_ms']:>8.1f} ms")
+    print(f"nipzip.py -h           {result['help_ms']:>8.1f} ms")
+    print(f"compress 2 KB file     {result['compress_small_ms']:>8.1f} ms")
+    print(f"decompress 2 KB file   {result['decompress_small_ms']:>8.1f} ms")
+    print(f"heavy modules imported {', '.join(result['heavy_imports']) or 'none'}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# throughput of every stage (frequency count, tree, header, encode, decode), peak memory, header size and ratio on each corpus and size
+# with zlib, bz2 and lzma as reference points, results are written as json so runs can be compared (--baseline)
+# every corpus and size runs in a fresh process so peak memory isn't carried over from the last one
+# startup time (see bench_startup.py) is measured and compared too, unless --no-startup is given
+# usage: py benchmarks/bench_suite.py [--corpora english,json] [--sizes 1K,1M,64M] [--out results.json] [--baseline old.json]
+
+import bz2
+import json
+import lzma
+import os.path
+import platform
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huffman_engine as engine
+import huffman_io_engine as io
+import bench_startup
+import corpora
+
+DEFAULT_SIZES = "1K,64K,1M,16M"
+MIN_TIME = 0.2 # seconds each stage is repeated for at least, so small sizes are timed over many runs
+
+REFERENCES = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "bz2": (lambda data: bz2.compress(data, 9), bz2.decompress),
+    "lzma": (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+def parse_size(text):
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    return int(text[:-1]) * units[text[-1].upper()] if text[-1].upper() in units else int(text)
+
+def timed(fn): # best seconds per call of fn, and its result
+    best, total = float("inf"), 0
+
+    while total < MIN_TIME:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+
+        best = min(best, elapsed)
+        total += elapsed
+
+    return best, result
+
+def measure(name, size): # runs in the child process, returns the results of one corpus and size
+    data = corpora.generate(name, size)
+    raw = data.encode("utf-8") if isinstance(data, str) else data
+    binary = isinstance(data, bytes)
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    stages = {}
+
+    def stage(key, fn):
+        seconds, result = timed(fn)
+        stages[key] = {"seconds": seconds, "mb_per_s": len(raw) / seconds / 2**20}
+        return result
+
+    freq = stage("freq", lambda: engine.freq_table(data))
+
+    def build():
+        tree = engine.Tree(freq)
+        tree.build_tree()
+        return engine._canonical_map(tree)
+
+    char_map = stage("tree", build)
+    text_bits = engine._text_bits(freq.table, char_map)
+    header = stage("header", lambda: io._encode_header(char_map, text_bits, io.FLAG_BYTES if binary else 0))
+
+    def encode():
+        out = bytearray(len(header) + (text_bits + 7) // 8)
+        out[:len(header)] = header
+        engine._pack_into(out, len(header), data, engine._packer(char_map))
+        return bytes(out)
+
+    blob = stage("encode", encode)
+    decoded = stage("decode", lambda: engine.decode(blob))
+
+    if decoded != data:
+        raise AssertionError(f"{name} {size}: round trip doesn't match")
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    reference = {}
+    for key, (compress, decompress) in REFERENCES.items():
+        compress_seconds, packed = timed(lambda: compress(raw))
+        decompress_seconds, _ = timed(lambda: decompress(packed))
+
+        reference[key] = {"ratio": len(raw) / len(packed), "compress_mb_per_s": len(raw) / compress_seconds / 2**20, "decompress_mb_per_s": len(raw) / decompress_seconds / 2**20}
+
+    return {
+        "corpus": name,
+        "size": size,
+        "bytes": len(raw),
+        "symbols": len(freq.table),
+        "header_bytes": len(header),
+        "compressed_bytes": len(blob),
+        "ratio": len(raw) / len(blob),
+        "stages": stages,
+        "compress_mb_per_s": len(raw) / sum(stages[key]["seconds"] for key in ("freq", "tree", "header", "encode")) / 2**20,
+        "base_rss_kb": base_rss, # after generating the corpus
+        "peak_rss_kb": peak_rss,
+        "reference": reference,
+    }
+
+def run(name, size):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, str(size)], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    if out.returncode:
+        raise RuntimeError(f"{name} {size} failed:\n{out.stderr}")
+
+    return json.loads(out.stdout.splitlines()[-1])
+
+def meta():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+
+    return {"date": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": commit, "python": platform.python_version(), "platform": platform.platform(), "numpy": engine._np().__version__ if engine._np() else None}
+
+def change(new, old): # relative change as a percentage
+    return f"{100 * (new - old) / old:+.1f}%" if old else ""
+
+def report(results, startup=None, baseline=None):
+    old = {(r["corpus"], r["size"]): r for r in baseline["results"]} if baseline else {}
+
+    print(f"{'corpus':<8} {'size':>10} {'ratio':>7} {'header':>7} {'freq':>8} {'tree':>8} {'encode':>8} {'decode':>8} {'rss MB':>7}   {'zlib':>6} {'bz2':>6} {'lzma':>6}")
+
+    for r in results:
+        stages = r["stages"]
+        print(f"{r['corpus']:<8} {r['size']:>10} {r['ratio']:>7.3f} {r['header_bytes']:>7} "
+              + " ".join(f"{stages[key]['mb_per_s']:>8.1f}" for key in ("freq", "tree", "encode", "decode"))
+              + f" {r['peak_rss_kb'] / 1024:>7.1f}   " + " ".join(f"{r['reference'][key]['ratio']:>6.2f}" for key in REFERENCES))
+
+        before = old.get((r["corpus"], r["size"]))
+        if before:
+            print(f"{'':<8} {'baseline':>10} {change(r['ratio'], before['ratio']):>7} {'':>7} "
+                  + " ".join(f"{change(stages[key]['mb_per_s'], before['stages'][key]['mb_per_s']):>8}" for key in ("freq", "tree", "encode", "decode"))
+                  + f" {change(r['peak_rss_kb'], before['peak_rss_kb']):>7}")
+
+    print("stages in MB/s of input, ratios are original / compressed size")
+
+    if startup:
+        before = (baseline or {}).get("startup", {})
+
+        for key in ("import_ms", "help_ms", "compress_small_ms", "decompress_small_ms"):
+            print(f"{key:<20} {startup[key]:>8.1f} {change(startup[key], before[key]) if key in before else '':>7}")
+
+        print(f"{'heavy_imports':<20} {', '.join(startup['heavy_imports']) or 'none'}")
+
+def main():
+    parser = OptionParser("py benchmarks/bench_suite.py [options]")
+    parser.add_option("--corpora", default=",".join(corpora.CORPORA), help=f"Comma separated corpora (default: all of {', '.join(corpora.CORPORA)})")
+    parser.add_option("--sizes", default=DEFAULT_SIZES, help=f"Comma separated sizes, K/M/G suffixes allowed up to e.g. 1G (default: {DEFAULT_SIZES})")
+    parser.add_option("--out", default=None, help="Json file the results are written to")
+    parser.add_option("--baseline", default=None, help="Json file of an earlier run to compare with")
+    parser.add_option("--no-startup", action="store_false", dest="startup", default=True, help="Doesn't measure startup time")
+    opts, _ = parser.parse_args()
+
+    names = opts.corpora.split(",")
+    for name in names:
+        if name not in corpora.CORPORA:
+            parser.error(f"Unknown corpus '{name}'")
+
+    baseline = None
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            baseline = json.load(f)
+
+    results = [run(name, parse_size(size)) for name in names for size in opts.sizes.split(",")]
+    startup = bench_startup.measure() if opts.startup else None
+    report(results, startup, baseline)
+
+    if opts.out:
+        with open(opts.out, "w") as f:
+            json.dump({"meta": meta(), "results": results, "startup": startup}, f, indent=1)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        print(json.dumps(measure(sys.argv[2], int(sys.argv[3]))))
+    else:
+        main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# times the array backed Tree against the builders it replaced on alphabets of 2 to 100k symbols:
+# the heap of node objects with recursive string codes, and the sorted list builder before that, O(n^2) in alphabet size
+# also the peak memory of the array and object trees, all of them must give the same (optimal) total code length
+# usage: py benchmarks/bench_tree.py [largest alphabet for the list builder]
+
+import heapq
+import os.path
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import huffman_engine as engine
+
+SIZES = [2, 16, 256, 1000, 4000, 16000, 100000]
+
+class Node: # the node objects both old builders used, with a dict per instance
+    def __init__(self, freq, left=None, right=None, val=None):
+        self.freq = freq
+        self.left = left
+        self.right = right
+        self.val = val
+
+    def get_code(self, code, cm):
+        if self.val is not None:
+            cm[self.val] = code
+            return
+
+        for child, bit in ((self.left, "0"), (self.right, "1")):
+            if child is not None:
+                child.get_code(code+bit, cm)
+
+def code_lengths(root):
+    cm = {}
+    root.get_code("", cm)
+    return {char: len(code) for char, code in cm.items()}
+
+def array_tree(freq):
+    tree = engine.Tree(freq)
+    tree.build_tree()
+    return tree.code_lengths()
+
+def object_tree(freq): # heap of node objects, the builder before the array tree
+    queue = [(v, p, Node(v, val=k)) for p, (k,v) in enumerate(freq.table.items())]
+    heapq.heapify(queue)
+    count = len(queue)
+
+    while len(queue) > 1:
+        s1 = heapq.heappop(queue)[2]
+        s2 = heapq.heappop(queue)[2]
+
+        heapq.heappush(queue, (s1.freq + s2.freq, count, Node(s1.freq + s2.freq, s1, s2)))
+        count += 1
+
+    root = queue[0][2]
+    return code_lengths(root if root.val is None else Node(root.freq, right=root))
+
+def legacy_tree(freq): # the sorted list builder build_tree used before the heap
+    queue = [Node(v, val=k) for k,v in freq.table.items()]
+
+    while not len(queue) < 3:
+        s1 = queue.pop()
+        s2 = queue.pop()
+
+        node = Node(s1.freq + s2.freq, s2, s1)
+
+        index = 0
+        while index < len(queue):
+            if queue[index].freq < node.freq:
+                queue.insert(index, node)
+                break
+
+            index += 1
+        else:
+            queue.append(node)
+
+    return code_lengths(Node(sum(n.freq for n in queue), queue[1] if len(queue) > 1 else None, queue[0]))
+
+def corpus(size): # every symbol appears, with zipf like frequencies (cjk block past the ascii range)
+    return "".join(chr(0x4e00 + i) * (1 + 200000 // (i + 1)) for i in range(size))
+
+def timed(build, freq, memory=True): # memory is measured on a second run, tracemalloc slows down the one it watches
+    start = time.perf_counter()
+    lengths = build(freq)
+    elapsed = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        build(freq)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    # weighted path length, i.e. the bits needed for the whole text
+    return elapsed, peak, sum(freq.table[c] * length for c, length in lengths.items())
+
+def main(legacy_max):
+    print(f"{'symbols':>8} {'array':>10} {'peak':>9} {'objects':>10} {'peak':>9} {'list':>10}")
+
+    for size in SIZES:
+        freq = engine.freq_table(corpus(size))
+        freq.table # sorted before timing
+
+        array_time, array_peak, array_bits = timed(array_tree, freq)
+        object_time, object_peak, object_bits = timed(object_tree, freq)
+        assert array_bits == object_bits, "code lengths differ"
+
+        result = f"{size:>8} {array_time:>9.4f}s {array_peak / 1024:>7.0f}KB {object_time:>9.4f}s {object_peak / 1024:>7.0f}KB"
+
+        if size <= legacy_max:
+            list_time, _, list_bits = timed(legacy_tree, freq, memory=False)
+            assert array_bits == list_bits, "code lengths differ"
+            result += f" {list_time:>9.4f}s"
+        else:
+            result += f" {'skipped':>10}"
+
+        print(result)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 16000)
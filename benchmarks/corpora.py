@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# deterministic corpora for the benchmarks, generated offline so every run (and machine) compresses the same data
+# text corpora return str, byte corpora return bytes, the same name and size always give the same data
+
+import json
+import random
+
+PIECE = 1 << 20 # generated a piece at a time, each from its own seed, so large sizes don't build one huge list
+
+WORDS = ("the of and to a in is it you that he was for on are with as I his they be at one have this from or had by hot but some what there we can "
+         "out other were all your when up use word how said an each she which do their time if will way about many then them would write like so these "
+         "her long make thing see him two has look more day could go come did my sound no most number who over know water than call first people may "
+         "down side been now find any new work part take get place made live where after back little only round man year came show every good me give "
+         "our under name very through just form much great think say help low line before turn cause same mean differ move right boy old too does tell").split()
+
+CJK = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)] + list("，。、？！：；「」")
+
+def _pieces(size, seed, piece): # joins piece(rand, size) generated a PIECE at a time
+    out, length, i = [], 0, 0
+
+    while length < size:
+        text = piece(random.Random(f"{seed}-{i}"), min(PIECE, size - length))
+        out.append(text)
+        length += len(text)
+        i += 1
+
+    return out[0][:0].join(out)[:size]
+
+def _zipf_weights(amount, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, amount + 1)]
+
+def english(size):
+    weights = _zipf_weights(len(WORDS))
+
+    def piece(rand, size):
+        out, length = [], 0
+
+        while length < size:
+            words = rand.choices(WORDS, weights, k=rand.randrange(5, 25))
+            sentence = " ".join(words).capitalize() + rand.choice([". ", ". ", "? ", "! ", ".\n\n"])
+            out.append(sentence)
+            length += len(sentence)
+
+        return "".join(out)
+
+    return _pieces(size, "english", piece)
+
+def source(size): # python-like code made from templates
+    names = ["data", "table", "offset", "length", "char_map", "header", "chunk", "result", "index", "count", "path", "value", "node", "tree"]
+    calls = ["len", "range", "sorted", "open", "print", "min", "max", "isinstance", "enumerate", "zip"]
+
+    def piece(rand, size):
+        out, length = [], 0
+
+        while length < size:
+            a, b, c = rand.sample(names, 3)
+            lines = [f"def {rand.choice(['get', 'read', 'write', 'build', 'encode'])}_{a}({b}, {c}=None):",
+                     f"    # {' '.join(rand.choices(WORDS, k=rand.randrange(4, 12)))}",
+                     f"    {a} = {rand.choice(calls)}({b})",
+                     f"    for {c} in range({rand.randrange(100)}):",
+                     f"        if {c} {rand.choice(['<', '>', '==', '!='])} {a}:",
+                     f"            {a} += {rand.choice(calls)}({b}[{c}])",
+                     f"    return {a}",
+                     "", ""]
+
+            block = "\n".join(lines[:rand.randrange(4, len(lines))]) + "\n\n"
+            out.append(block)
+            length += len(block)
+
+        return "".join(out)
+
+    return _pieces(size, "source", piece)
+
+def json_logs(size):
+    def piece(rand, size):
+        out, length = [], 0
+
+        while length < size:
+            line = json.dumps({"ts": 1700000000 + rand.randrange(10**6), "level": rand.choices(["info", "debug", "warn", "error"], [70, 20, 8, 2])[0],
+                               "user": rand.randrange(10**5), "path": rand.choice(["/api/items", "/api/users", "/login", "/static/app.js"]),
+                               "ms": round(rand.expovariate(0.05), 2)}) + "\n"
+            out.append(line)
+            length += len(line)
+
+        return "".join(out)
+
+    return _pieces(size, "json", piece)
+
+def cjk(size):
+    weights = _zipf_weights(len(CJK), 0.9)
+    return _pieces(size, "cjk", lambda rand, size: "".join(rand.choices(CJK, weights, k=size)))
+
+def random_bytes(size):
+    return _pieces(size, "random", lambda rand, size: rand.randbytes(size))
+
+def skewed(size): # bytes with a few common values and a long tail, like a binary file
+    weights = [random.Random(value).expovariate(1) ** 3 for value in range(256)]
+    return _pieces(size, "skewed", lambda rand, size: bytes(rand.choices(range(256), weights, k=size)))
+
+CORPORA = {
+    "english": english,
+    "source": source,
+    "json": json_logs,
+    "cjk": cjk,
+    "random": random_bytes,
+    "skewed": skewed,
+}
+
+def generate(name, size):
+    return CORPORA[name](size)
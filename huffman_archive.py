@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+import huffman_engine as engine
+import huffman_io_engine as io
+import os.path
+import time
+import zlib
+
+'''
+structure of archive file (.nza):
+    header:
+        magic bytes "NZA"
+        version byte
+    members and shared tables, one after the other:
+        member: the contents of a .bin file (version 2) made by huffman_engine.encode()
+        shared table: the contents of a table file (.nzt) members were compressed with
+    central directory:
+        varint amount of tables, for each: varint file offset, varint size
+        varint amount of members, for each:
+            varint size of the name, utf-8 name ("/" between folders)
+            varint file offset, varint compressed size, varint original size, varint modification time (seconds)
+            4 bytes: crc32 of the original data
+    8 bytes: file offset of the central directory
+
+    the directory is found with one seek from the end, so listing doesn't read any members and extracting one is one more seek
+    adding members writes them over the old directory and the new directory after them, nothing before is rewritten
+    a member added again under the same name replaces the old entry, its old data is left unused
+'''
+
+MAGIC = b"NZA"
+VERSION = 1
+
+class Archive_member:
+    # entry of the central directory
+    def __init__(self, name, offset, size, length, mtime, crc):
+        self.name = name
+        self.offset = offset # of the member's .bin data
+        self.size = size # compressed
+        self.length = length # original
+        self.mtime = mtime
+        self.crc = crc
+
+    def __str__(self):
+        return f"{self.name}  {io.formatsize(self.length)} -> {io.formatsize(self.size)}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(self.mtime))}"
+
+def _encode_directory(tables, members):
+    out = bytearray(io._write_varint(len(tables)))
+
+    for offset, size in tables:
+        out += io._write_varint(offset) + io._write_varint(size)
+
+    out += io._write_varint(len(members))
+
+    for member in members:
+        name = member.name.encode("utf-8")
+        out += io._write_varint(len(name)) + name
+
+        for field in (member.offset, member.size, member.length, member.mtime):
+            out += io._write_varint(field)
+
+        out += member.crc.to_bytes(4, "big")
+
+    return bytes(out)
+
+def _read_directory(data): # returns the (offset, size) of every table and the members, by name
+    amount, pos = io._read_varint(data, 0)
+    tables = []
+
+    for _ in range(amount):
+        offset, pos = io._read_varint(data, pos)
+        size, pos = io._read_varint(data, pos)
+        tables.append((offset, size))
+
+    amount, pos = io._read_varint(data, pos)
+    members = {}
+
+    for _ in range(amount):
+        size, pos = io._read_varint(data, pos)
+        name = data[pos:pos+size].decode("utf-8")
+        pos += size
+
+        fields = []
+        for _ in range(4):
+            field, pos = io._read_varint(data, pos)
+            fields.append(field)
+
+        members[name] = Archive_member(name, *fields, int.from_bytes(data[pos:pos+4], "big"))
+        pos += 4
+
+    return tables, members
+
+class Archive:
+    '''
+    nipzip archive, opened like a zipfile
+    mode "r" reads, "w" creates a new archive and "a" adds to an archive (creating it if it doesn't exist)
+    table is a shared table (a Shared_table or the path of its table file) members are compressed with when it has every character they use,
+    it's stored in the archive once so the archive can be read without it
+    '''
+
+    def __init__(self, path, mode="r", table=None):
+        if mode not in ("r", "w", "a"):
+            raise ValueError(f"Invalid archive mode: '{mode}'")
+
+        self.path = os.path.abspath(path)
+        self.mode = mode
+        self.table = engine._load_table(table) if table is not None else None
+
+        self._tables = [] # (offset, size) of every stored table
+        self._members = {} # Archive_member by name, in the order they were added
+
+        if mode == "w" or mode == "a" and not os.path.exists(self.path):
+            self._file = open(self.path, "wb+")
+            self._file.write(MAGIC + bytes([VERSION]))
+            self._end = self._file.tell() # where the next member goes, the directory is written there on close
+        else:
+            self._file = open(self.path, "rb" if mode == "r" else "rb+")
+            self._end = self._read_directory()
+
+        self._stored_ids = {self._load_table(offset, size).id for offset, size in self._tables}
+
+    def _read_directory(self): # loads the central directory, returns its offset
+        f = self._file
+
+        if f.read(len(MAGIC) + 1) != MAGIC + bytes([VERSION]):
+            raise ValueError("Not a nipzip archive")
+
+        f.seek(-8, 2)
+        end = f.tell()
+
+        f.seek(int.from_bytes(f.read(8), "big"))
+        start = f.tell()
+
+        self._tables, self._members = _read_directory(f.read(end - start))
+        return start
+
+    def _load_table(self, offset, size): # registers a stored table, so members compressed with it can be decoded
+        self._file.seek(offset)
+        return engine._load_table(self._file.read(size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._members.values())
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, name):
+        return name in self._members
+
+    def names(self):
+        return list(self._members)
+
+    def info(self, name):
+        if name not in self._members:
+            raise KeyError(f"No member named '{name}' in the archive")
+
+        return self._members[name]
+
+    def read(self, name): # the original data of a member, checked against its crc32
+        member = self.info(name)
+
+        self._file.seek(member.offset)
+        data = engine.decode(self._file.read(member.size))
+
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        if zlib.crc32(data) != member.crc:
+            raise ValueError(f"Member '{name}' doesn't match its checksum")
+
+        return data
+
+    def write(self, name, data, mtime=None):
+        # adds data (bytes) as a member, replacing any member with the same name
+        if self.mode == "r":
+            raise ValueError("Archive is opened for reading")
+
+        if self.table is not None and self.table.id not in self._stored_ids:
+            self._tables.append((self._end, len(self.table.data)))
+            self._stored_ids.add(self.table.id)
+            self._append(self.table.data)
+
+        blob = self._encode(data)
+        self._members.pop(name, None) # the new entry goes to the end
+
+        self._members[name] = Archive_member(name, self._end, len(blob), len(data), int(time.time() if mtime is None else mtime), zlib.crc32(data))
+        self._append(blob)
+
+    def add(self, path, name=None):
+        # adds a file, or every file under a directory, named by their path from the directory's parent unless name is given
+        path = os.path.abspath(path)
+
+        if os.path.isfile(path):
+            paths = [(path, name or os.path.basename(path))]
+        else:
+            base = name or os.path.basename(path)
+            paths = [(os.path.join(root, file), "/".join([base, *os.path.relpath(os.path.join(root, file), path).split(os.sep)]))
+                     for root, dirs, files in sorted(os.walk(path)) for file in sorted(files)]
+
+        paths = [(file, member) for file, member in paths if file != self.path] # when the archive is inside the folder
+
+        for file, member in paths:
+            with open(file, "rb") as f:
+                self.write(member, f.read(), os.path.getmtime(file))
+
+        return [member for _, member in paths]
+
+    def extract(self, name, outfile):
+        with open(outfile, "wb+") as f:
+            f.write(self.read(name))
+
+        member = self._members[name]
+        os.utime(outfile, (member.mtime, member.mtime))
+
+    def extractall(self, folder):
+        for name in self._members:
+            outfile = os.path.join(folder, *name.split("/"))
+
+            if not os.path.abspath(outfile).startswith(os.path.abspath(folder) + os.sep): # names like ../x
+                raise ValueError(f"Member '{name}' would be extracted outside of '{folder}'")
+
+            os.makedirs(os.path.dirname(outfile), exist_ok=True)
+            self.extract(name, outfile)
+
+    def close(self):
+        if self._file.closed:
+            return
+
+        if self.mode != "r":
+            self._file.seek(self._end)
+            self._file.write(_encode_directory(self._tables, list(self._members.values())))
+            self._file.write(self._end.to_bytes(8, "big"))
+            self._file.truncate()
+
+        self._file.close()
+
+    def _encode(self, data):
+        # members are compressed as raw bytes, or as utf-8 text with a table trained on text, so they come back byte for byte
+        if self.table is not None and not self.table.flags & io.FLAG_BYTES:
+            try:
+                return engine.encode(data.decode("utf-8"), table=self.table)
+            except UnicodeDecodeError:
+                return engine.encode(data)
+
+        return engine.encode(data, table=self.table)
+
+    def _append(self, data):
+        self._file.seek(self._end)
+        self._file.write(data)
+        self._end += len(data)
@@ -1,165 +1,309 @@
 #!/usr/bin/env python3
 import huffman_io_engine as io
-import numpy as np
-import traceback
+from io import BytesIO
+import array
+import collections
+import contextlib
+import heapq
+import mmap
 import os.path
 import sys
-
-def safe_import():
-    global bitarray
-    from bitarray import bitarray
+import time
 
 INDENT = "\t"
 
-# Node contains leaf_node or node children
-class Node:
-    def __init__(self):
-        self.left = None
-        self.right = None
-        self.freq = None
-        self.label = "Node"
-
-    # recursively generates code identifier up to each leaf node
-    def generate_code(self, code):
-        if type(self.right) == Leaf_node:
-            setattr(self.right, "code", code+"1")
-        elif not self.right is None:
-            self.right.generate_code(code+"1")
-
-        if type(self.left) == Leaf_node:
-            setattr(self.left, "code", code+"0")
-        elif not self.left is None:
-            self.left.generate_code(code+"0")
-
-    # fetches code recursively but stores in an object as to not deal with return values
-    def get_code(self, cm):
-        if not self.right is None:
-            self.right.get_code(cm)
-        if not self.left is None:
-            self.left.get_code(cm)
-
-    # to display the tree
-    def __str__(self, recursion_depth):
-        print(f"{INDENT*recursion_depth}label: {self.label}")
-        print(f"{INDENT*recursion_depth}freq: {self.freq}")
-        
-        print(self.left.__str__(recursion_depth+1))
-        print(self.right.__str__(recursion_depth+1))
+class Tree:
+    '''
+    huffman tree kept as flat parallel arrays rather than node objects: node i has freq[i], parent[i], left[i] and right[i] (-1 for none)
+    the leaves come first, one per character in table order, then the merged nodes in the order they were made, the root is last
+    so every parent comes after its children, and code lengths and (integer) codes are assigned by one pass from the root down
+    with no recursion, however deep a skewed tree gets
+    '''
 
-        return f"{INDENT*recursion_depth}|endnode|"
-        
-class Leaf_node:
-    def __init__(self, val, freq):
-        self.val = val
-        self.freq = freq
-
-    def __str__(self, recursion_depth):
-        return f"""\
-{INDENT*recursion_depth}{'-'*20}
-{INDENT*recursion_depth}label: '{self.val}'
-{INDENT*recursion_depth}freq: {self.freq}
-{INDENT*recursion_depth}code: {self.code}
-{INDENT*recursion_depth}{'-'*20}"""
-
-    def get_code(self, cm):
-        cm.cm[self.val] = self.code
+    __slots__ = ("_freq", "table", "symbols", "freq", "parent", "left", "right", "lengths", "codes")
 
-class Tree:
     def __init__(self, string):
-        self._freq = freq_table(string)
+        # accepts a prebuilt frequency table (e.g. counted chunk by chunk) or the string itself
+        self._freq = string if isinstance(string, freq_table) else freq_table(string)
         self.table = self._freq.table
 
+    @property
+    def root(self):
+        return len(self.freq) - 1
+
     def build_tree(self):
-        # makes a leaf node for every unique character
-        queue = [Leaf_node(k,v) for k,v in self.table.items()] # node priority queue
+        self.symbols = list(self.table)
+        leaves = len(self.symbols)
 
-        while not len(queue) < 3:
-            s1 = queue.pop()
-            s2 = queue.pop()
+        freq = self.freq = array.array("q", self.table.values())
+        parent = self.parent = array.array("q", [-1]) * leaves
+        left = self.left = array.array("q", [-1]) * leaves
+        right = self.right = array.array("q", [-1]) * leaves
 
-            node = Node()
-            if s1.freq < s1.freq:
-                node.left = s1
-                node.right = s2
-            else:
-                node.left = s2
-                node.right = s1
+        # heap entries are (frequency, node), the node number breaks ties so equal frequencies merge in a fixed order
+        queue = [(count, node) for node, count in enumerate(freq)] # node priority queue
+        heapq.heapify(queue)
 
-            node.freq = sum([node.left.freq, node.right.freq])
+        # merges the two least frequent nodes until only the root is left, O(n log n)
+        while len(queue) > 1:
+            freq1, node1 = heapq.heappop(queue)
+            freq2, node2 = heapq.heappop(queue)
+            node = len(freq)
 
-            # maintains a queue ordered by (total) frequency
-            _append = False
-            index = 0
-            while index < len(queue):
-                if queue[index].freq < node.freq:
-                    queue.insert(index, node)
-                    break
+            freq.append(freq1 + freq2)
+            parent.append(-1)
+            left.append(node1)
+            right.append(node2)
+            parent[node1] = parent[node2] = node
 
-                index += 1
-            else: # if node is the lowest, while loop wouldn't have broken
-                _append = True
+            heapq.heappush(queue, (freq1 + freq2, node))
 
-            if _append:
-                queue.append(node)
+        # accommodates for only one character, which still needs a one bit code
+        if leaves == 1:
+            freq.append(freq[0])
+            parent.append(-1)
+            left.append(-1)
+            right.append(0)
+            parent[0] = 1
 
-        self.root = Node()
-        self.root.label = "Root"
-        self.root.freq = sum(self.table.values())
-        
-        self.root.right = queue[0]
+        # codes of every node from its parent's, parents always come later so going backwards reaches them first
+        lengths = self.lengths = array.array("q", [0]) * len(freq)
+        codes = self.codes = [0] * len(freq)
 
-        # accommodates for only one child left
-        if not len(queue) == 1:
-            self.root.left = queue[1]
-            
-        # generates code for all leaves 
-        self.root.generate_code("")
+        for node in range(len(freq) - 2, -1, -1):
+            up = parent[node]
+            lengths[node] = lengths[up] + 1
+            codes[node] = codes[up] << 1 | (right[up] == node)
 
-    def get_code(self, cm):
-        self.root.get_code(cm)
+    def code_lengths(self): # character to code length
+        return dict(zip(self.symbols, self.lengths))
 
+    def get_codes(self): # character to (code, length), the codes as the tree generated them rather than canonical ones
+        return {char: (self.codes[leaf], self.lengths[leaf]) for leaf, char in enumerate(self.symbols)}
+
+    # to display the tree, a debug view walking it from the root (left before right) with a stack
     def __str__(self):
-        return self.root.__str__(0)
+        lines = []
+        stack = [(self.root, 0)]
+
+        while stack:
+            node, depth = stack.pop()
+            indent = INDENT * depth
+
+            if node < len(self.symbols):
+                code = format(self.codes[node], f"0{self.lengths[node]}b")
+                lines += [f"{indent}{'-'*20}", f"{indent}label: {self.symbols[node]!r}", f"{indent}freq: {self.freq[node]}", f"{indent}code: {code}", f"{indent}{'-'*20}"]
+                continue
+
+            lines += [f"{indent}label: {'Root' if node == self.root else 'Node'}", f"{indent}freq: {self.freq[node]}"]
+            stack += [(child, depth + 1) for child in (self.right[node], self.left[node]) if child >= 0]
+
+        return "\n".join(lines)
 
 class freq_table:
-    def __init__(self, string):
+    '''
+    character frequency histogram the Tree is built from, counts by character are in all_freq
+    text is counted as an array of code points and raw bytes as an array of byte values, a piece at a time, with numpy
+    small inputs (or any input without numpy) are counted by collections.Counter instead, which is quicker than importing numpy
+    tables counted separately (blocks of a file, chunks counted by workers, the blocks a Compressor has seen) add up with merge()
+    '''
+
+    def __init__(self, string=""):
         self.all_freq = {}
         self.sorted_freq = {}
-        self.string = string
-        self._init()
+        self.update(string)
+
+    # counts another chunk of text into the table, so a file can be counted without being held in memory
+    def update(self, string):
+        np = _np() if len(string) >= VECTORIZE_MIN_SIZE else None
+
+        if np is None:
+            self.merge(collections.Counter(_symbols(string)))
+            return
+
+        if isinstance(string, str):
+            pieces = (_code_points(string[i:i+DEFAULT_CHUNK_SIZE]) for i in range(0, len(string), DEFAULT_CHUNK_SIZE))
+        else: # raw bytes, each byte value is stored as the character with that code point
+            data = np.frombuffer(string, dtype=np.uint8)
+            pieces = (data[i:i+DEFAULT_CHUNK_SIZE] for i in range(0, len(data), DEFAULT_CHUNK_SIZE))
+
+        # bincount works on a 64 bit copy of its input, so it's given a piece at a time
+        for codes in pieces:
+            values, counts = _histogram(codes)
+
+            for value, count in zip(values.tolist(), counts.tolist()):
+                char = chr(value)
+                self.all_freq[char] = self.all_freq.get(char, 0) + count
+
+        self.sorted_freq = {}
+
+    def merge(self, other):
+        # adds the counts of another freq_table (or a dict of counts by character), returns self
+        for char, count in (other.all_freq if isinstance(other, freq_table) else other).items():
+            self.all_freq[char] = self.all_freq.get(char, 0) + count
+
+        self.sorted_freq = {}
+        return self
 
     def _init(self):
-        # creates a character to frequency table
-        for char in self.string:
-            if not char in self.all_freq.keys():
-                self.all_freq[char] = 1
-            else:
-                self.all_freq[char] += 1
-
-        # sorts by frequency to optimise (binary) code length
-        while self.all_freq:
-            for k,v in self.all_freq.items():
-                if v == max(self.all_freq.values()):
-                    self.sorted_freq[k] = v
-                    del self.all_freq[k]
-                    break
+        # sorts by frequency to optimise (binary) code length, equal frequencies by character
+        # so the table is the same however the data was split up and merged
+        self.sorted_freq = dict(sorted(self.all_freq.items(), key=lambda p: (-p[1], p[0])))
 
     @property
     def table(self):
+        if not self.sorted_freq:
+            self._init()
+
         return self.sorted_freq
 
-class Char_map:
-    def __init__(self):
-        self.char_map = {}
+def _code_points(text): # numpy array of the code points of text, one byte each for ascii
+    np = _np()
 
-    @property
-    def cm(self):
-        return self.char_map
+    try: # str.isascii() would need python 3.7, the encode stops at the first other character
+        return np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    except UnicodeEncodeError:
+        return np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+
+def _histogram(codes):
+    # distinct values in an array of code points and how often each one comes up
+    # a dense alphabet is counted with bincount, a wide one (e.g. emoji, rare cjk) with np.unique so it doesn't need a count for every code point up to the largest
+    np = _np()
+
+    if codes.dtype == np.uint8 or int(codes.max()) < DENSE_ALPHABET:
+        counts = np.bincount(codes)
+        values = np.flatnonzero(counts)
+        return values, counts[values]
+
+    return np.unique(codes, return_counts=True)
+
+_numpy = None # numpy once _np() has imported it, False when it isn't installed
+
+def _np():
+    # numpy, imported the first time it's needed rather than with the engine, so commands that don't use it (decompressing, small files) start quicker
+    # None when it isn't installed, the callers fall back to pure python
+    global _numpy
+
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+
+    return _numpy or None
+
+class Code_arrays:
+    '''
+    char map stored as numpy arrays sorted by code point
+    lets a whole chunk of text be encoded with array operations rather than a python loop per character/bit
+    only used for codes of up to 64 bits, which fit a single word
+    '''
+
+    def __init__(self, char_map):
+        np = _np()
+        chars = sorted(char_map)
+        lengths = [char_map[c][1] for c in chars]
+
+        self.points = np.array([ord(c) for c in chars], dtype=np.uint32)
+        self.lengths = np.array(lengths, dtype=np.int64)
+
+        # codes are stored left aligned in a 64 bit word, so placing one at any bit offset is a single shift
+        self.codes = np.array([char_map[c][0] << (64 - l) for c, l in zip(chars, lengths)], dtype=np.uint64)
+
+        # small alphabets get a direct code point to index lookup instead of a binary search
+        self.lookup = None
+        if self.points[-1] < 1 << 16:
+            self.lookup = np.zeros(int(self.points[-1]) + 1, dtype=np.int64)
+            self.lookup[self.points] = np.arange(len(chars))
+
+    # encodes string (or raw bytes) after the nbits pending bits in acc, returns the whole bytes and the bits left over (same as io._pack_codes)
+    def pack(self, string, acc=0, nbits=0):
+        np = _np()
+
+        # maps every character to its index in the sorted arrays in one go
+        if isinstance(string, str):
+            points = np.frombuffer(string.encode("utf-32-le"), dtype=np.uint32)
+        else:
+            points = np.frombuffer(string, dtype=np.uint8)
+
+        index = self.lookup[points] if self.lookup is not None else np.searchsorted(self.points, points)
+        codes, lengths = self.codes[index], self.lengths[index]
+
+        # the pending bits go first, as if they were one more code
+        if nbits:
+            codes = np.concatenate(([np.uint64(acc << (64 - nbits))], codes))
+            lengths = np.concatenate(([nbits], lengths))
+
+        if not len(lengths):
+            return b"", 0, 0
+
+        # bit offset of every code in the output, split into a 64 bit word and the offset within it
+        starts = np.cumsum(lengths) - lengths
+        total = int(starts[-1] + lengths[-1])
+        offset = starts & 63
+
+        # codes running past the end of their word spill their low bits into the next one
+        cross = np.flatnonzero(offset + lengths > 64)
+        head = codes >> offset.astype(np.uint64)
+        tail = codes[cross] << (64 - offset[cross]).astype(np.uint64)
+
+        # codes never overlap, so or-ing together every code starting in a word builds that word
+        last = int(starts[-1] >> 6)
+        words = np.zeros(last + 2, dtype=np.uint64)
+        words[:last+1] = np.bitwise_or.reduceat(head, np.searchsorted(starts, np.arange(last + 1) * 64))
+        words[(starts[cross] >> 6) + 1] |= tail
+
+        data = words.astype(">u8").tobytes()
+        cut = total // 8
+
+        # the last partial byte is returned as pending bits
+        return data[:cut], data[cut] >> (8 - total % 8) if total % 8 else 0, total % 8
 
 ######################################################################################
 
 '''
-structure of bin file:
+structure of bin file (version 2):
+    header:
+        magic bytes "NZ\xff" - can't be the start of a version 1 file
+        version byte
+        flags byte:
+            bit 0 set when the symbols are the raw bytes of the file (code points 0-255) rather than characters
+            bit 1 set when the table is in a shared table file
+        varint: size of the table in bytes
+        table:
+            varint: amount of labels/characters
+            varint per character: code point, as the difference from the previous one (ascending order)
+            run length coded code lengths (varint length, varint run) in the same order
+        or with a shared table, 8 bytes: id of the table (from a hash of it) in place of its size and the table
+        varint: length of the compressed text in bits
+    data:
+        compressed text, canonical huffman codes rebuilt from the code lengths
+        zero bits filling the last byte
+
+structure of bin file (version 3, blocks):
+    header:
+        magic bytes, version byte, flags byte (as version 2)
+    records, each starting with a tag byte:
+        1 = table: varint size of the table, table (as version 2)
+        2 = block: varint length of the compressed text in bits, compressed text filling whole bytes
+            decoded with the last table before it
+        0 = end of records
+    index:
+        varint amount of tables, varint file offset of each table record
+        varint amount of blocks, for each block record:
+            varint file offset, varint compressed bits, varint characters, varint uncompressed bytes (utf-8), varint table number
+    8 bytes: file offset of the index
+
+    blocks are encoded independently, so they can be compressed and decompressed in parallel
+    and the file can still be decoded front to back without the index
+
+structure of table file (.nzt, shared table):
+    magic bytes "NZT"
+    flags byte (bit 0 as version 2)
+    varint: size of the table in bytes, table (as version 2)
+
+structure of bin file (version 1, read only):
     header:
         tree
         filler bits
@@ -173,168 +317,1594 @@ structure of bin file:
                 encoding (00=0=ascii, 01=1=utf8, 10=2=utf16, 11=3=utf32)
 '''
 
-def compress(infile, outfile=None):
-    str_mode = outfile == "STRING"
+DEFAULT_CHUNK_SIZE = 1 << 20 # characters read at a time when streaming
+DEFAULT_BLOCK_SIZE = 1 << 22 # characters per block when compressing into blocks
+DEFAULT_STREAM_BLOCK_SIZE = 1 << 16 # characters per block of Compressor, small so output starts soon after input
+DENSE_ALPHABET = 1 << 16 # text whose code points are all below this is counted with bincount (see _histogram)
+VECTORIZE_MIN_SIZE = 1 << 16 # characters (or bytes) from which counting and encoding use numpy, smaller inputs don't make up for importing it
+
+PIPE = "-" # infile/outfile reading from stdin or writing to stdout
+
+class _Quiet_logger:
+    # stands in for nipzip's BasicLogger when the engine is used from python, nothing is printed and errors raise instead of exiting
+    def log(self, level, *content):
+        if level.lower() in ("fatal", "error"):
+            raise RuntimeError(" ".join(map(str, content)))
+
+# set by nipzip.py, the defaults are for the engine used from python
+logger = _Quiet_logger()
+verbose = False
+override = True # existing destination files are replaced, like open(path, "w") would, instead of prompting
+
+class Stats:
+    '''
+    timers (seconds and calls) and counters of the engine's stages, collected while in a collect() block
+    bytes_in/bytes_out count what was read and written (characters for text read from a file), symbols what was encoded or decoded
+    stages run in worker processes (jobs > 1, recursive mode) are timed as a whole, as the time spent waiting for them
+    '''
+
+    STAGES = ("read", "freq", "tree", "codes", "header", "encode", "decode", "write")
+
+    def __init__(self):
+        self.times = dict.fromkeys(self.STAGES, 0.0)
+        self.calls = dict.fromkeys(self.STAGES, 0)
+        self.counters = {"bytes_in": 0, "bytes_out": 0, "symbols": 0}
+
+    def timer(self, stage):
+        return _Stage_timer(self, stage)
+
+    def as_dict(self):
+        return {
+            "stages": {stage: {"seconds": self.times[stage], "calls": self.calls[stage]} for stage in self.STAGES if self.calls[stage]},
+            "counters": dict(self.counters),
+            "seconds": sum(self.times.values()),
+        }
+
+    def __str__(self):
+        total = sum(self.times.values()) or 1
+        lines = [f"{'stage':<8} {'seconds':>9} {'calls':>7} {'share':>6}"]
+
+        for stage in self.STAGES:
+            if self.calls[stage]:
+                lines.append(f"{stage:<8} {self.times[stage]:>9.4f} {self.calls[stage]:>7} {100 * self.times[stage] / total:>5.1f}%")
+
+        lines.append(", ".join(f"{key}: {value}" for key, value in self.counters.items()))
+        return "\n".join(lines)
+
+class _Stage_timer:
+    __slots__ = ("stats", "stage", "start")
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.stats.times[self.stage] += time.perf_counter() - self.start
+        self.stats.calls[self.stage] += 1
+
+class _No_timer: # stands in for _Stage_timer when nothing is collected, so a stage only costs an empty with block
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+_NO_TIMER = _No_timer()
+_stats = None # Stats being collected, see collect()
+
+@contextlib.contextmanager
+def collect(stats=None):
+    '''
+    collects timers and counters of everything the engine does in this process inside the with block
+    yields the Stats (a new one unless stats is given to add to), e.g. with collect() as stats: compress(...)
+    '''
+
+    global _stats
+
+    previous, _stats = _stats, stats or Stats()
 
     try:
-        if not str_mode:
-            infile = os.path.abspath(infile)
-            logger.log("info", f"Reading data from '{infile}'")
+        yield _stats
+    finally:
+        _stats = previous
 
-            if verbose:
-                print(f"File size before compression: ~ {io.formatsize(os.path.getsize(infile))}")
-        
-            with open(infile, "r") as f:
-                string = f.read()
+def _timer(stage): # times the with block as stage if stats are being collected
+    return _stats.timer(stage) if _stats is not None else _NO_TIMER
 
-            logger.log("info", f"Data read successfully; building Huffman Tree")
-        
+def _count(counter, amount):
+    if _stats is not None:
+        _stats.counters[counter] += amount
+
+def _read(f, size, count=True):
+    # f.read(size), timed and counted unless count is False (the file is read again) or f is in memory (decode counts its input itself)
+    with _timer("read"):
+        data = f.read(size)
+
+    if count and not isinstance(f, BytesIO):
+        _count("bytes_in", len(data))
+
+    return data
+
+def _write(f, data): # f.write(data), timed and counted
+    with _timer("write"):
+        f.write(data)
+
+    _count("bytes_out", len(data))
+
+def _log_unexpected(): # logs the exception being handled with its traceback, which is only imported once something has gone wrong
+    if isinstance(logger, _Quiet_logger): # used from python, the exception itself is more use than its traceback as a message
+        raise
+
+    import traceback
+    logger.log("error", "An unexpected error occurred: ", "".join(traceback.format_exception(*sys.exc_info())))
+
+def _prepare_outfile(infile, outfile, ext, replace=True):
+    if outfile is None: # creates outfile destination if not provided, replacing or adding to the source file's extension
+        outfile = (os.path.splitext(infile)[0] if replace else infile) + ext
+
+    if (not override and os.path.exists(outfile)): # warn user if file already exists
+        io.warn_override_file(outfile, logger)
+
+    return outfile
+
+def _package_merge(table, max_len):
+    '''
+    optimal code lengths of at most max_len bits for a character to frequency table (package-merge)
+    every level holds the characters plus the previous level paired up into packages, both sorted by weight
+    the cheapest 2n-2 items of the last level are chosen, and a character's code length is how many of them it appears in
+    '''
+
+    chars = list(table)
+
+    if len(chars) > 1 << max_len:
+        raise ValueError(f"{len(chars)} characters can't all have codes of {max_len} bits or less")
+
+    if len(chars) == 1:
+        return {chars[0]: 1}
+
+    # items are (weight, payload), the payload is either a character's index or a pair of items
+    leaves = sorted((table[char], i) for i, char in enumerate(chars))
+    level = leaves
+
+    for _ in range(max_len - 1):
+        packages = [(level[i][0] + level[i+1][0], (level[i], level[i+1])) for i in range(0, len(level) - 1, 2)]
+        level = list(heapq.merge(leaves, packages, key=lambda item: item[0])) # characters first on equal weights
+
+    lengths = [0] * len(chars)
+    stack = [item[1] for item in level[:2*len(chars) - 2]]
+
+    while stack:
+        payload = stack.pop()
+
+        if type(payload) == int:
+            lengths[payload] += 1
         else:
-            string = infile
-            logger.log("info", f"Building Huffman Tree")
-        
-        tree = Tree(string) # contructs huffman tree recursively
+            stack.extend(item[1] for item in payload)
+
+    return dict(zip(chars, lengths))
+
+def _canonical_map(tree, max_code_len=None): # canonical codes with the same lengths as the codes generated by the tree
+    lengths = tree.code_lengths()
+
+    # only recomputes the lengths when the tree actually goes over the limit
+    if max_code_len and max(lengths.values()) > max_code_len:
+        lengths = _package_merge(tree.table, max_code_len)
+
+    return io._canonical_codes(lengths)
+
+def _symbols(string): # raw bytes as a string of one character per byte, for the pure python encoders
+    return string if isinstance(string, str) else str(string, "latin-1")
+
+def _encoding(header): # how the decoded symbols are turned back into bytes
+    return "latin-1" if header.flags & io.FLAG_BYTES else "utf-8"
+
+def _text_bits(table, char_map): # length of the compressed text from the character frequencies
+    return sum(freq * char_map[char][1] for char, freq in table.items())
+
+def _max_code_len(char_map):
+    return max(length for _, length in char_map.values())
+
+def _display_table(char_map, encoding=None):
+    if not char_map: # empty input, nothing has a code
+        print("Lookup table generated: empty\n")
+        return
+
+    print("Lookup table generated:")
+    io.display_dict([(char, format(code, f"0{length}b")) for char, (code, length) in sorted(char_map.items(), key=lambda p: p[1][1], reverse=True)], cols=4)
+
+    if encoding: # version 1 files only
+        print("\nEncoding:", {
+            "00": "ASCII",
+            "01": "UTF-8",
+            "10": "UTF-16",
+            "11": "UTF-32"
+        }[encoding])
+    else:
+        print()
+
+def _map_file(f, write=False):
+    '''
+    maps an open file into memory, so it's read and written through the page cache without copying it into python objects
+    empty files can't be mapped and are returned as they are
+    '''
+
+    if not os.fstat(f.fileno()).st_size:
+        return f
+
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if write else mmap.ACCESS_READ)
+
+def _packer(char_map, vectorize=True): # function encoding a chunk after (acc, nbits) pending bits, returns (bytes, acc, nbits)
+    python = lambda chunk, acc=0, nbits=0: io._pack_codes(_symbols(chunk), char_map, acc, nbits) # pure python fallback
+
+    if not vectorize or _max_code_len(char_map) > 64: # longer codes don't fit the array encoder's words
+        return python
+
+    arrays = None # built on the first chunk big enough to be worth it, both encoders write the same bits
+
+    def pack(chunk, acc=0, nbits=0):
+        nonlocal arrays
+
+        if len(chunk) < VECTORIZE_MIN_SIZE or _np() is None:
+            return python(chunk, acc, nbits)
+
+        if arrays is None:
+            arrays = Code_arrays(char_map)
+
+        return arrays.pack(chunk, acc, nbits)
+
+    return pack
+
+def _plan(string, binary=False, max_code_len=None, table=None):
+    '''
+    works out the codes for compressing string whole (version 2), without logging or writing anything
+    returns (tree, char map, shared table, header, size of the whole output)
+    tree is None when a shared table is used or string is empty, shared table is None when table is missing characters of string
+    '''
+
+    with _timer("freq"):
+        freq = freq_table(string)
+
+    shared = _load_table(table) if table is not None else None
+    tree = None
+
+    if shared is not None and (shared.flags & io.FLAG_BYTES) != (io.FLAG_BYTES if binary else 0):
+        raise ValueError(f"Shared table was trained on {'bytes' if shared.flags & io.FLAG_BYTES else 'text'}")
+
+    if shared is not None and not all(char in shared.char_map for char in freq.table):
+        shared = None
+
+    if shared is not None:
+        char_map = shared.char_map
+    elif freq.table:
+        with _timer("tree"):
+            tree = Tree(freq) # contructs huffman tree
+            tree.build_tree()
+
+        with _timer("codes"):
+            char_map = _canonical_map(tree, max_code_len) # copies lookup table to separate object for encoding
+    else:
+        char_map = {} # empty input, the header is all there is
+
+    with _timer("header"):
+        text_bits = _text_bits(freq.table, char_map)
+        header = io._encode_header(char_map, text_bits, io.FLAG_BYTES if binary else 0, shared.id if shared else None)
+
+    return tree, char_map, shared, header, len(header) + (text_bits + 7) // 8 # the size of the output is known before encoding
+
+def _encoder(char_map, shared=None, vectorize=True): # pack function for _pack_into, shared tables keep theirs between files
+    if shared is not None and vectorize:
+        return shared.pack
+
+    return _packer(char_map, vectorize) if char_map else None
+
+def _pack_into(buf, pos, string, pack): # encodes string into buf starting at byte pos with a function from _packer
+    # encodes a chunk at a time to keep the temporary arrays small
+    acc = nbits = 0
+    _count("symbols", len(string))
+
+    with _timer("encode"):
+        for i in range(0, len(string), DEFAULT_CHUNK_SIZE):
+            packed, acc, nbits = pack(string[i:i+DEFAULT_CHUNK_SIZE], acc, nbits)
+
+            buf[pos:pos+len(packed)] = packed
+            pos += len(packed)
+
+        if nbits: # zero bits filling the last byte
+            buf[pos] = acc << (8 - nbits)
+
+def _pack_block(pack, chunk):
+    # compresses a block with pack (see _packer), used by every block writer so their records always agree
+    # returns the compressed block filling whole bytes, its length in bits, characters and utf-8 (or raw) bytes
+    packed, acc, nbits = pack(chunk)
+
+    if nbits: # zero bits filling the last byte
+        packed += bytes([acc << (8 - nbits)])
+
+    return packed, len(packed)*8 - (8 - nbits) % 8, len(chunk), len(chunk.encode("utf-8")) if isinstance(chunk, str) else len(chunk)
+
+class Shared_table:
+    '''
+    code table trained on sample files and kept in a table file, so small files compressed with it don't each carry a table
+    the encoder and decoder are built the first time they're needed and kept with the table
+    '''
+
+    def __init__(self, char_map, flags=0):
+        self.char_map = char_map
+        self.flags = flags
+        self.data = io._encode_table_file(char_map, flags)
+        self.id = io._table_id(self.data)
+
+        self._pack = None
+        self._decoder = None
+
+    @property
+    def pack(self):
+        if self._pack is None:
+            self._pack = _packer(self.char_map)
+
+        return self._pack
+
+    @property
+    def decoder(self):
+        if self._decoder is None:
+            self._decoder = io.Decode_table(self.char_map)
+
+        return self._decoder
+
+# every table loaded in this process, so it's only read once and files compressed with it can be decompressed without naming it again
+_shared_tables = {} # (modification time, Shared_table) by absolute path
+_shared_ids = {} # Shared_table by id
+
+def _load_table(table): # a Shared_table, the contents of a table file, or the path of a table file to load it from
+    if isinstance(table, (bytes, bytearray)):
+        flags, char_map = io._read_table_file(table)
+        table = Shared_table(char_map, flags)
+
+    if isinstance(table, Shared_table):
+        _shared_ids[table.id] = table
+        return table
+
+    path = os.path.abspath(table)
+    mtime = os.path.getmtime(path)
+
+    if path not in _shared_tables or _shared_tables[path][0] != mtime:
+        with open(path, "rb") as f:
+            flags, char_map = io._read_table_file(f.read())
+
+        _shared_tables[path] = (mtime, Shared_table(char_map, flags))
+
+    shared = _shared_tables[path][1]
+    _shared_ids[shared.id] = shared
+
+    return shared
+
+def _read_header(f, table=None): # io._read_header, looking up the shared table of files compressed with one
+    if table is not None:
+        _load_table(table)
+
+    with _timer("header"):
+        header = io._read_header(f)
+
+    if header.table_id is not None:
+        if header.table_id not in _shared_ids:
+            raise ValueError("Error decoding - file was compressed with a shared table that wasn't given (--table)")
+
+        header.tree = _shared_ids[header.table_id].char_map
+
+    return header
+
+def _decoder(header): # decode table for the compressed text after header, shared tables keep theirs between files
+    with _timer("codes"):
+        return _shared_ids[header.table_id].decoder if header.table_id is not None else io.Decode_table(header.tree)
+
+def _is_output(name): # .bin and .nzt files, and temp files of an interrupted batch, which are never compressed or trained on
+    return os.path.splitext(name)[1] in [".bin", ".nzt"] or ".bin." in name and name.endswith(".tmp")
+
+def _read_samples(paths, binary=False):
+    # yields a freq_table for every file in paths, each read a block at a time
+    # in text mode, files that aren't text are skipped with a warning instead of ending the run or counting part of them
+    mode, eof = ("rb", b"") if binary else ("r", "")
+
+    for path in paths:
+        freq = freq_table()
+
+        try:
+            with open(path, mode) as f:
+                for block in iter(lambda: f.read(DEFAULT_BLOCK_SIZE), eof):
+                    with _timer("freq"):
+                        freq.update(block)
+
+        except UnicodeDecodeError:
+            logger.log("warn", f"Skipping '{path}', it can't be read as text (train with --binary to use it)")
+            continue
+
+        yield freq
+
+def _train_table(samples, binary=False, max_code_len=None): # Shared_table for an iterable of samples (str, or bytes-like in binary mode, or freq_tables)
+    freq = freq_table()
+
+    for sample in samples:
+        with _timer("freq"):
+            if isinstance(sample, freq_table):
+                freq.merge(sample)
+            else:
+                freq.update(sample)
+
+    freq.update(bytes(range(256)) if binary else "".join(map(chr, range(128))))
+
+    with _timer("tree"):
+        tree = Tree(freq)
         tree.build_tree()
 
-        cm = Char_map()
-        tree.get_code(cm)
-        char_map = cm.cm # copies lookup table to separate object for encoding
+    with _timer("codes"):
+        return Shared_table(_canonical_map(tree, max_code_len), io.FLAG_BYTES if binary else 0)
+
+def train(source, outfile=None, binary=False, max_code_len=None):
+    '''
+    builds a shared code table from sample data (a file, or every file in a directory) and writes it to a table file
+    every ascii character (every byte value in binary mode) gets a code even if the samples don't have it,
+    so most files with characters that weren't in the samples can still be compressed with the table
+    returns the Shared_table
+    '''
+
+    try:
+        source = os.path.abspath(source)
+        paths = [source] if os.path.isfile(source) else sorted(os.path.join(root, name) for root, _, names in os.walk(source) for name in names if not _is_output(name))
 
-        logger.log("info", "Tree constructed, building formatted binary stream")
+        logger.log("info", f"Counting characters in {len(paths)} sample file(s)")
 
-        encoding = io._get_encoding(string)
-        treedata, amount_of_chars, max_len_code = io._encode_tree(char_map, encoding)
+        shared = _train_table(_read_samples(paths, binary), binary, max_code_len)
 
         if verbose:
-            print(tree)
-            print("Encoding:", {
-                "00": "ASCII",
-                "01": "UTF-8",
-                "10": "UTF-16",
-                "11": "UTF-32"
-            }[encoding])
-        
-        bitstring = "1" + "".join(char_map[i] for i in string)
-        bitarr = bitarray(
-            # tree data
-            treedata +
+            _display_table(shared.char_map)
 
-            # actual encoded data
-            [0 for _ in range(8-(len(bitstring) % 8))] + # filler bits
-            list(map(int,bitstring)) + # compressed text
+        outfile = _prepare_outfile(source, outfile, ".nzt")
+        logger.log("info", f"Writing table {shared.id.hex()} to '{os.path.abspath(outfile)}'")
 
-            # 2 data bytes
-            [int(i) for i in amount_of_chars + 
-             max_len_code + 
-             encoding]
-        )
+        with open(outfile, "wb+") as f:
+            f.write(shared.data)
 
-        if not str_mode:
-            if outfile is None:
-                outfile = os.path.splitext(infile)[0] + ".bin" # creates outfile destination if not provided
-                
-            if (not override and os.path.exists(outfile)): # warn user if file already exists
-                io.warn_override_file(outfile, logger)
+        return shared
 
-            logger.log("info", f"Writing to '{os.path.abspath(outfile)}'")
+    except Exception:
+        _log_unexpected()
 
-            if verbose:
-                print("Compressed data:")
-                
-                if len(bitarr) <= 1000:
-                    print(("="*20)+">", bitarr, ("="*20)+">", sep="\n")
-                else:
-                    print(("="*20)+">", "".join(map(lambda i: str(int(i)),bitarr[:500])), "\n\t...\n" , "".join(map(lambda i: str(int(i)),bitarr[-500:])), ("="*20)+">", sep="\n")
-                
-            with open(outfile, "wb+") as f:
-                bitarr.tofile(f)
+def encode(data, max_code_len=None, vectorize=True, table=None):
+    '''
+    compresses data in memory and returns the contents of a .bin file
+    str is compressed as text, bytes-like objects as raw bytes
+    raises on bad input rather than logging, and doesn't use logger, verbose or override, so it can be called from library code
+    '''
 
-            if verbose:
-                print(f"File size after compression: ~ {io.formatsize(os.path.getsize(outfile))}")
-                print(f"Compression ratio: {os.path.getsize(infile)/os.path.getsize(outfile)}")
+    binary = not isinstance(data, str)
+    _count("bytes_in", len(data))
 
-        else:
-            print("Compressed data:\n", "="*40, sep="")
-            print("".join(map(lambda i: str(int(i)),bitarr)), "="*40, sep="\n")
-            
-    except Exception as e:
-        logger.log("error", "An unexpected error occurred: ", "".join(traceback.format_exception(*sys.exc_info())))
+    _, char_map, shared, header, size = _plan(data, binary, max_code_len, table)
 
-def decompress(infile, outfile=None):
-    str_mode = outfile == "STRING"
+    out = bytearray(size)
+    out[:len(header)] = header
+    _pack_into(out, len(header), data, _encoder(char_map, shared, vectorize))
 
-    try:
-        uncompressed = ""
+    _count("bytes_out", size)
+    return bytes(out)
 
-        if not str_mode:
-            if verbose:
-                print(f"File size before decompression: ~ {io.formatsize(os.path.getsize(infile))}")
+def decode(blob, table=None):
+    '''
+    decompresses the contents of a .bin file (any version) in memory
+    returns str for text and bytes for files compressed as raw bytes, raises like encode()
+    '''
 
-            logger.log("info", f"Reading data from '{os.path.abspath(infile)}'")
-            string = "".join(io._reformat_bin(list(map(str, np.fromfile(infile, "u1"))))) # reads int from file and converts it to binary
-            logger.log("info", f"Data read and parsed successfully; constructing lookup table.")
+    f = BytesIO(blob)
+    header = _read_header(f, table)
+    text = "".join(_decode_stream(f, header, max(len(blob), 1)))
 
-        else:
-            string = infile
-            logger.log("info", "Constructing lookup table")
+    _count("bytes_in", len(blob))
+    _count("bytes_out", len(text))
 
-        string, data_bytes = string[:-16], string[-16:] # gets last 2 bytes from data
-        tree, string, encoding = io._get_tree(string, data_bytes) # decodes tree data and returns rest of data
+    return text.encode("latin-1") if header.flags & io.FLAG_BYTES else text
 
-        logger.log("info", f"Table constructed; preparing string for decompression")
+class Compressor:
+    '''
+    compresses data as it arrives, like zlib.compressobj
+    input is buffered into blocks of block_size characters (bytes for bytes-like input) and every full block is returned straight away as a version 3 block record
+    flush() returns the rest, and once finished the output put together is a complete version 3 .bin file
+    a block keeps the last table while it has a code for every character in it, adaptive mode also changes table whenever that's cheaper (see _next_table)
+    otherwise a new table is built from the counts of every block so far, so it fits the stream as a whole rather than the block that needed it
+    table is a shared table (or the path of its table file) used as the first table, version 3 files store it like any other table
+    '''
 
-        if verbose:
-            print("Lookup table generated:")
-            io.display_dict(tree, cols=4, reverse=True)
-            print("\nEncoding:", {
-                "00": "ASCII",
-                "01": "UTF-8",
-                "10": "UTF-16",
-                "11": "UTF-32"
-            }[encoding])
-            
-        # gets rid of filler bits
-        while not int(string[0]):
-            string = string[1:]
-        string = string[1:]
-
-        # decodes from lookup
-        while string:
-            for p, code in enumerate(tree):
-                if code[0] == string[:len(code[0])]:
-                    uncompressed += code[1]
-                    string = string[len(code[0]):]
-                    break
-            else: # in the case where character does not exist
-                logger.log("fatal", "Error decoding - code not found in string; exiting.")
+    def __init__(self, block_size=DEFAULT_STREAM_BLOCK_SIZE, max_code_len=None, adaptive=False, vectorize=True, table=None):
+        self.block_size = block_size
+        self.max_code_len = max_code_len
+        self.adaptive = adaptive
+        self.vectorize = vectorize
 
-        if not str_mode:
-            if outfile is None:
-                outfile = os.path.splitext(infile)[0] + ".txt" # creates outfile destination if not provided
+        self._char_map = _load_table(table).char_map if table is not None else None
+        self._pack = None
+        self._freq = freq_table() # counts of every block, unless adaptive
+        self._binary = None # decided by the first chunk
+        self._pending = [] # input not written to a block yet
+        self._pending_size = 0
 
-            if (not override and os.path.exists(outfile)): # warns user if file already exists
-                io.warn_override_file(outfile, logger)
+        self._pos = 0 # bytes returned so far, the offsets in the index
+        self._tables, self._blocks = [], []
+        self._finished = False
 
-            logger.log("info", f"Uncompressed string formed; writing to '{os.path.abspath(outfile)}'")
+    def compress(self, data):
+        # data is str (text) or bytes-like (raw bytes), every call has to be the same kind as the first
+        if self._finished:
+            raise ValueError("Compressor already flushed with finish=True")
 
-            if verbose:
-                print("Raw text:")
-                
-                if len(uncompressed) <= 1000:
-                    print(("="*20)+">", uncompressed, ("="*20)+">", sep="\n")
-                else:
-                    print(("="*20)+">", uncompressed[:500], "\n\t...\n" , uncompressed[-500:], ("="*20)+">", sep="\n")
-                
-            with open(outfile, "w+") as f:
-                f.write(uncompressed)
+        if not len(data):
+            return b""
 
-            if verbose:
-                print(f"File size after decompression: ~ {io.formatsize(os.path.getsize(outfile))}")
-                print(f"Compression ratio: {os.path.getsize(outfile)/os.path.getsize(infile)}")
-        
-        else:
-            print("Decompressed data:\n", "="*40, sep="")
-            print(uncompressed, "="*40, sep="\n")
+        binary = not isinstance(data, str)
+        _count("bytes_in", len(data))
+        out = bytearray()
 
-    except:
-        logger.log("error", "An unexpected error occurred: ", "".join(traceback.format_exception(*sys.exc_info())))
+        if self._binary is None:
+            self._binary = binary
+            out += io.MAGIC + bytes([io.VERSION_BLOCKS, io.FLAG_BYTES if binary else 0])
+
+        elif binary != self._binary:
+            raise TypeError(f"Compressor was given {'bytes' if self._binary else 'str'} before, got {type(data).__name__}")
+
+        self._pending.append(data if not binary else bytes(data))
+        self._pending_size += len(data)
+
+        if self._pending_size >= self.block_size:
+            pending = ("" if not binary else b"").join(self._pending)
+            whole = len(pending) - len(pending) % self.block_size
+
+            for i in range(0, whole, self.block_size):
+                out += self._block(pending[i:i+self.block_size], len(out))
+
+            self._pending = [pending[whole:]] if whole < len(pending) else []
+            self._pending_size = len(pending) - whole
+
+        self._pos += len(out)
+        return bytes(out)
+
+    def flush(self, finish=True):
+        # writes everything buffered as a block, finish also ends the file with its index
+        # finish=False is like zlib's Z_SYNC_FLUSH, the receiver can decode everything sent so far and more can follow
+        if self._finished:
+            return b""
+
+        out = bytearray()
+
+        if self._binary is None: # nothing was compressed, still makes a valid (empty) file
+            self._binary = False
+            out += io.MAGIC + bytes([io.VERSION_BLOCKS, 0])
+
+        if self._pending_size:
+            out += self._block(("" if not self._binary else b"").join(self._pending), len(out))
+            self._pending, self._pending_size = [], 0
+
+        if finish:
+            out.append(io.END)
+
+            index = self._pos + len(out)
+            out += io._encode_index(self._tables, self._blocks) + index.to_bytes(8, "big")
+            self._finished = True
+
+        self._pos += len(out)
+        return bytes(out)
+
+    def _block(self, chunk, offset): # table record (if the block needs a new table) and block record of chunk, offset is where it starts in the output not yet returned
+        out = bytearray()
+
+        with _timer("freq"):
+            freq = freq_table(chunk)
+
+            if not self.adaptive:
+                self._freq.merge(freq)
+
+        if self.adaptive or self._char_map is None or not all(char in self._char_map for char in freq.table):
+            with _timer("tree"):
+                new_map = _next_table(freq if self.adaptive else self._freq, self._char_map, self.max_code_len)
+
+            if new_map is not None:
+                self._char_map, self._pack = new_map, None
+
+        if self._pack is None: # first block, or the table just changed
+            self._tables.append(self._pos + offset)
+            out += io._encode_table_record(self._char_map)
+            self._pack = _packer(self._char_map, self.vectorize)
+
+        with _timer("encode"):
+            packed, text_bits, chars, size = _pack_block(self._pack, chunk)
+
+        _count("symbols", chars)
+
+        self._blocks.append((self._pos + offset + len(out), text_bits, chars, size, len(self._tables) - 1))
+        out += io._encode_block_record(packed, text_bits)
+
+        return out
+
+class Decompressor:
+    '''
+    decompresses a .bin file (version 2 or 3) as it arrives, like zlib.decompressobj
+    decompress(data) returns the bytes decoded so far, utf-8 for text, codes split between calls are kept by a Bit_reader
+    eof is set at the end of the file, anything given after it is kept in unused_data
+    version 1 files keep part of their header at the end, so they can't be decompressed incrementally
+    '''
+
+    def __init__(self, table=None):
+        self.table = table # needed for version 2 files compressed with a shared table, unless it's already been loaded
+        self.eof = False
+        self.unused_data = b""
+
+        self._buf = bytearray()
+        self._header = None
+        self._decoder = None
+        self._reader = None
+        self._left = 0 # bytes of compressed text left in the current block (the whole text in version 2)
+        self._pad = 0
+        self._index = None # [varints left, varints per entry] of the parts of the index not skipped yet, once the end record is reached
+
+    def decompress(self, data):
+        if self.eof:
+            self.unused_data += data
+            return b""
+
+        self._buf += data
+        out = []
+
+        while not self.eof:
+            if self._left: # compressed text, decoded as far as it goes
+                chunk = bytes(self._buf[:self._left])
+
+                if not chunk:
+                    break
+
+                del self._buf[:len(chunk)]
+                self._left -= len(chunk)
+
+                with _timer("decode"):
+                    out.append(self._reader.decode(self._decoder, chunk, final=not self._left, pad=self._pad))
+
+                _count("symbols", len(out[-1]))
+
+            elif not self._parse():
+                break
+
+        if self.eof:
+            self.unused_data, self._buf = bytes(self._buf), bytearray()
+
+        text = "".join(out)
+        return text.encode("latin-1") if self._header is not None and self._header.flags & io.FLAG_BYTES else text.encode("utf-8")
+
+    def _parse(self):
+        # reads the header or record at the start of the buffer, returns False if it isn't all there yet
+        if self._index is not None:
+            return self._parse_index()
+
+        data = self._buf
+
+        try:
+            if self._header is None:
+                pos = self._parse_header(data)
+            elif self._header.version == io.VERSION_BLOCKS:
+                pos = self._parse_record(data)
+            else:
+                pos = 0
+                self.eof = True # version 2 files end with their text
+
+        except IndexError: # stopped partway through a varint or table
+            return False
+
+        del self._buf[:pos]
+        return True
+
+    def _parse_header(self, data):
+        if bytes(data[:len(io.MAGIC)]) != io.MAGIC[:len(data)]: # version 1 files have no magic bytes
+            raise ValueError("Version 1 files can't be decompressed incrementally")
+
+        header = io.Bin_header()
+        header.version, header.flags = _slice(data, len(io.MAGIC), 2)
+        pos = len(io.MAGIC) + 2
+
+        if header.version not in (io.VERSION, io.VERSION_BLOCKS):
+            raise ValueError(f"Unsupported .bin version {header.version}")
+
+        if header.version == io.VERSION:
+            if header.flags & io.FLAG_SHARED:
+                header.table_id = bytes(_slice(data, pos, io.TABLE_ID_SIZE))
+                pos += io.TABLE_ID_SIZE
+            else:
+                table, pos = _read_sized(data, pos)
+                header.tree = io._get_tree(table)
+
+            text_bits, pos = io._read_varint(data, pos)
+
+            if header.table_id is not None:
+                header = _read_header(BytesIO(data[:pos]), self.table) # looks up the shared table
+
+            self._start_text(text_bits, _decoder(header) if header.tree else None)
+
+            if not text_bits:
+                self.eof = True
+
+        self._header = header
+        return pos
+
+    def _parse_record(self, data):
+        tag = data[0]
+
+        if tag == io.END: # the index follows, which is only needed for seeking
+            self._index = [[None, 1], [None, 5]] # offsets of the tables, 5 varints for every block
+            return 1
+
+        if tag == io.TABLE:
+            table, pos = _read_sized(data, 1)
+            self._decoder = io.Decode_table(io._get_tree(table))
+            return pos
+
+        if tag == io.BLOCK:
+            if self._decoder is None:
+                raise ValueError("Error decoding - block file doesn't start with a table")
+
+            text_bits, pos = io._read_varint(data, 1)
+            self._start_text(text_bits, self._decoder)
+            return pos
+
+        raise ValueError(f"Error decoding - unknown record {tag}")
+
+    def _parse_index(self):
+        # skips the index a varint at a time, keeping its place between calls so every byte is only read once
+        # however small the pieces the file arrives in, returns True once the index and its offset are read
+        data, pos = self._buf, 0
+
+        try:
+            while self._index:
+                part = self._index[0]
+
+                if part[0] is None: # amount of entries comes first
+                    amount, pos = io._read_varint(data, pos)
+                    part[0] = amount * part[1]
+                elif part[0]:
+                    _, pos = io._read_varint(data, pos)
+                    part[0] -= 1
+                else:
+                    self._index.pop(0)
+
+            _slice(data, pos, 8)
+            pos += 8
+            self.eof = True
+
+        except IndexError: # the rest hasn't arrived yet
+            pass
+
+        del self._buf[:pos]
+        return self.eof
+
+    def _start_text(self, text_bits, decoder):
+        self._decoder = decoder
+        self._reader = io.Bit_reader()
+        self._left = (text_bits + 7) // 8
+        self._pad = self._left*8 - text_bits
+
+def _slice(data, pos, size): # data[pos:pos+size], raising IndexError like a short varint if it isn't all there
+    if pos + size > len(data):
+        raise IndexError
+
+    return data[pos:pos+size]
+
+def _read_sized(data, pos): # a varint size followed by that many bytes, returns them and the position after
+    size, pos = io._read_varint(data, pos)
+    return bytes(_slice(data, pos, size)), pos + size
+
+def compress(infile, outfile=None, chunk_size=None, vectorize=True, max_code_len=None, jobs=None, binary=False, use_mmap=True, adaptive=False, table=None):
+    # binary compresses the raw bytes of the file instead of its text, so any file can be compressed
+    # use_mmap maps binary input and the output file into memory instead of holding copies of them
+    # adaptive gives blocks a new table whenever the distribution of characters changes enough to be worth it
+    # table is a shared table (or the path of its table file) used instead of building a tree, see train()
+    # infile or outfile "-" reads from stdin or writes to stdout, see _compress_pipe
+    str_mode = outfile == "STRING"
+
+    try:
+        if PIPE in (infile, outfile):
+            return _compress_pipe(infile, outfile, binary, chunk_size, max_code_len, adaptive, table)
+
+        if table is not None and (chunk_size or jobs or adaptive):
+            raise ValueError("Shared tables can't be used in block mode")
+
+        if not str_mode and (chunk_size or jobs or adaptive): # block mode, never reads the whole file
+            return _compress_blocks(infile, outfile, chunk_size or DEFAULT_BLOCK_SIZE, jobs or 1, vectorize, max_code_len, binary, adaptive)
+
+        if not str_mode:
+            infile = os.path.abspath(infile)
+            logger.log("info", f"Reading data from '{infile}'")
+
+            if verbose:
+                print(f"File size before compression: ~ {io.formatsize(os.path.getsize(infile))}")
+        
+            with open(infile, "rb" if binary else "r") as f, _timer("read"):
+                # text has to be decoded, so only raw bytes can be used straight from the mapped file
+                string = memoryview(_map_file(f)) if binary and use_mmap and os.path.getsize(infile) else f.read()
+
+            _count("bytes_in", len(string))
+
+            logger.log("info", f"Data read successfully; building Huffman Tree")
+        
+        else:
+            string = infile
+            logger.log("info", f"Building Huffman Tree")
+        
+        tree, char_map, shared, header, size = _plan(string, binary, max_code_len, table)
+
+        if table is not None and shared is None:
+            logger.log("warn", "Characters missing from the shared table, storing a table in the file instead")
+
+        if shared is None:
+            logger.log("info", "Tree constructed, building formatted binary stream")
+
+            if verbose and tree is not None:
+                print(tree)
+        else:
+            logger.log("info", f"Using shared table {shared.id.hex()}, building formatted binary stream")
+
+        if verbose:
+            _display_table(char_map)
+
+        if str_mode:
+            data = bytearray(size)
+            data[:len(header)] = header
+            _pack_into(data, len(header), string, _encoder(char_map, shared, vectorize))
+
+            print("Compressed data:\n", "="*40, sep="")
+            print(io._bytes_to_bits(data), "="*40, sep="\n")
+            return
+
+        outfile = _prepare_outfile(infile, outfile, ".bin", replace=not binary)
+        logger.log("info", f"Writing to '{os.path.abspath(outfile)}'")
+
+        out = open(outfile, "wb+") # opened outside the try, a file that couldn't be created isn't there to remove
+
+        try:
+            # the map is closed (flushing it) before the file, on errors too
+            with out, contextlib.ExitStack() as stack:
+                out.truncate(size)
+                data = stack.enter_context(_map_file(out, write=True)) if use_mmap else bytearray(size) # encoded straight into the mapped output file
+
+                data[:len(header)] = header
+                _pack_into(data, len(header), string, _encoder(char_map, shared, vectorize))
+
+                if verbose:
+                    print("Compressed data:")
+                    
+                    if size <= 125:
+                        print(("="*20)+">", io._bytes_to_bits(data[:]), ("="*20)+">", sep="\n")
+                    else:
+                        print(("="*20)+">", io._bytes_to_bits(data[:63])[:500], "\n\t...\n" , io._bytes_to_bits(data[-63:])[-500:], ("="*20)+">", sep="\n")
+
+                with _timer("write"):
+                    if use_mmap:
+                        stack.close()
+                    else:
+                        out.write(data)
+
+        except BaseException: # interrupted too, a truncated file would only fail to decompress later
+            os.remove(outfile)
+            raise
+
+        _count("bytes_out", size)
+
+        if verbose:
+            print(f"File size after compression: ~ {io.formatsize(os.path.getsize(outfile))}")
+            print(f"Compression ratio: {os.path.getsize(infile)/os.path.getsize(outfile)}")
+            
+    except Exception as e:
+        _log_unexpected()
+
+# set in every worker process by _init_worker, so the char map is only sent once per process (or once per table in adaptive mode)
+_block_table = None
+_block_pack = None
+
+def _init_worker(char_map, vectorize, table=0):
+    global _block_table, _block_pack
+
+    _block_table = table
+    _block_pack = _packer(char_map, vectorize)
+
+def _encode_block(chunk, table=None):
+    # _pack_block with the char map of this process
+    # in adaptive mode table is (table number, char map, vectorize) for the table the block uses
+    if table is not None and table[0] != _block_table:
+        _init_worker(table[1], table[2], table[0])
+
+    return _pack_block(_block_pack, chunk)
+
+def _pool(jobs, initializer=None, initargs=()): # pool of worker processes, concurrent.futures is only imported once one is needed
+    import concurrent.futures
+    return concurrent.futures.ProcessPoolExecutor(jobs, initializer=initializer, initargs=initargs)
+
+def _count_block(chunk): # counts of a chunk counted by a worker process
+    return freq_table(chunk).all_freq
+
+def _count_chunks(chunks, jobs=1):
+    # frequency table of all the chunks put together
+    # with jobs > 1 they're counted by a pool of worker processes and their histograms merged, at most 2 chunks per job in flight
+    freq = freq_table()
+
+    if jobs <= 1:
+        for chunk in chunks:
+            with _timer("freq"):
+                freq.update(chunk)
+
+        return freq
+
+    with _pool(jobs) as pool:
+        queue = collections.deque()
+
+        for chunk in chunks:
+            queue.append(pool.submit(_count_block, chunk))
+
+            if len(queue) >= 2 * jobs:
+                with _timer("freq"):
+                    freq.merge(queue.popleft().result())
+
+        while queue:
+            with _timer("freq"):
+                freq.merge(queue.popleft().result())
+
+    return freq
+
+def _next_table(freq, char_map, max_code_len=None):
+    '''
+    picks the table for the next block in adaptive mode, returns a new char map or None to keep using char_map
+    a new table costs its table record as well as the block, so it's only used when that adds up to fewer bits
+    '''
+
+    tree = Tree(freq)
+    tree.build_tree()
+
+    new_map = _canonical_map(tree, max_code_len)
+    new_cost = _text_bits(freq.table, new_map) + 8*len(io._encode_table_record(new_map))
+
+    # the last table can only be reused if it has a code for every character in the block
+    if char_map is not None and all(char in char_map for char in freq.table):
+        if _text_bits(freq.table, char_map) <= new_cost:
+            return None
+
+    return new_map
+
+def _compress_blocks(infile, outfile, block_size, jobs=1, vectorize=True, max_code_len=None, binary=False, adaptive=False):
+    # makes two passes over the file so only a few blocks are ever held in memory
+    # the first counts character frequencies (merging the counts of every block), the second encodes every block with the shared table
+    # adaptive mode makes a single pass instead, counting every block and giving it a new table when that's cheaper than the last one
+    # blocks are independent, so with jobs > 1 they are encoded by a pool of worker processes
+    global _block_table
+
+    infile = os.path.abspath(infile)
+
+    if verbose:
+        print(f"File size before compression: ~ {io.formatsize(os.path.getsize(infile))}")
+
+    mode, eof = ("rb", b"") if binary else ("r", "")
+    char_map = None
+
+    if not adaptive:
+        logger.log("info", f"Counting characters in '{infile}' in blocks of {block_size} with {jobs} job(s)")
+
+        with open(infile, mode) as f:
+            freq = _count_chunks(iter(lambda: _read(f, block_size), eof), jobs)
+
+        if not freq.table: # empty file, only the header, end record and index are written
+            logger.log("info", f"Nothing to compress in '{infile}'")
+
+        else:
+            logger.log("info", f"Data counted successfully; building Huffman Tree")
+
+            with _timer("tree"):
+                tree = Tree(freq)
+                tree.build_tree()
+
+            with _timer("codes"):
+                char_map = _canonical_map(tree, max_code_len)
+
+            logger.log("info", f"Tree constructed, encoding blocks with {jobs} job(s)")
+
+            if verbose:
+                print(tree)
+                _display_table(char_map)
+
+    else:
+        logger.log("info", f"Encoding '{infile}' in blocks of {block_size} with adaptive tables and {jobs} job(s)")
+
+    outfile = _prepare_outfile(infile, outfile, ".bin", replace=not binary)
+    logger.log("info", f"Writing to '{os.path.abspath(outfile)}'")
+
+    # forgets the tables of the last file encoded in this process, before any pool is forked with them
+    # or an adaptive block numbered like one of them would be encoded with its codes
+    _block_table = None
+
+    pool = None
+    if not adaptive and char_map is None:
+        pass # empty file, there are no blocks to encode
+    elif jobs > 1 and adaptive: # workers are sent every table along with its blocks
+        pool = _pool(jobs)
+    elif jobs > 1:
+        pool = _pool(jobs, initializer=_init_worker, initargs=(char_map, vectorize))
+    elif not adaptive:
+        _init_worker(char_map, vectorize)
+
+    tables, blocks = [], []
+
+    def write(block, new_map): # blocks are written in input order, after the table record of a new table
+        if new_map is not None:
+            tables.append(out.tell())
+            _write(out, io._encode_table_record(new_map))
+
+        data, text_bits, chars, size = block
+        blocks.append((out.tell(), text_bits, chars, size, len(tables) - 1))
+        _write(out, io._encode_block_record(data, text_bits))
+        _count("symbols", chars)
+
+    try:
+        with open(infile, mode) as f, open(outfile, "wb+") as out:
+            out.write(io.MAGIC + bytes([io.VERSION_BLOCKS, io.FLAG_BYTES if binary else 0]))
+
+            # at most 2 blocks per job are in flight, which bounds memory use
+            queue = collections.deque()
+            new_map = char_map # the shared table is written before the first block
+            ntables = 0
+
+            for chunk in iter(lambda: _read(f, block_size, adaptive), eof): # the first pass already counted the input
+                table = None
+
+                if adaptive:
+                    with _timer("freq"):
+                        freq = freq_table(chunk)
+
+                    with _timer("tree"):
+                        new_map = _next_table(freq, char_map, max_code_len)
+
+                    if new_map is not None:
+                        char_map = new_map
+                        ntables += 1
+
+                    table = (ntables - 1, char_map, vectorize)
+
+                if pool is None:
+                    with _timer("encode"):
+                        block = _encode_block(chunk, table)
+
+                    write(block, new_map)
+                else:
+                    queue.append((pool.submit(_encode_block, chunk, table), new_map))
+
+                    if len(queue) >= 2 * jobs:
+                        future, table_map = queue.popleft()
+
+                        with _timer("encode"): # waiting on the workers
+                            block = future.result()
+
+                        write(block, table_map)
+
+                new_map = None
+
+            while queue:
+                future, table_map = queue.popleft()
+
+                with _timer("encode"):
+                    block = future.result()
+
+                write(block, table_map)
+
+            out.write(bytes([io.END]))
+
+            index = out.tell()
+            out.write(io._encode_index(tables, blocks))
+            out.write(index.to_bytes(8, "big"))
+
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if verbose:
+        print(f"Blocks written: {len(blocks)}, tables written: {len(tables)}")
+        print(f"File size after compression: ~ {io.formatsize(os.path.getsize(outfile))}")
+        print(f"Compression ratio: {os.path.getsize(infile)/os.path.getsize(outfile)}")
+
+def _read_table(f, offset): # decode table for the table record at offset in a version 3 file
+    f.seek(offset)
+
+    if f.read(1) != bytes([io.TABLE]):
+        raise ValueError("Error decoding - index doesn't point at a table")
+
+    with _timer("codes"):
+        return io.Decode_table(io._get_tree(f.read(io._read_varint_stream(f))))
+
+def _read_block(f, table, offset, text_bits, chars): # decodes the whole block record at offset in a version 3 file
+    f.seek(offset)
+
+    if f.read(1) != bytes([io.BLOCK]) or io._read_varint_stream(f) != text_bits:
+        raise ValueError("Error decoding - index doesn't match the block it points at")
+
+    length = (text_bits + 7) // 8
+    data = _read(f, length)
+
+    if len(data) < length:
+        raise ValueError("Error decoding - compressed data is truncated")
+
+    with _timer("decode"):
+        text = io.Bit_reader().decode(table, data, pad=length*8 - text_bits)
+
+    _count("symbols", len(text))
+
+    if len(text) != chars:
+        raise ValueError("Error decoding - block doesn't decode to the length in the index")
+
+    return text
+
+# set in every worker process by _init_decoder, each worker reads its blocks from its own handle
+_block_file = None
+_block_tables = {} # decode tables by table record offset, built the first time a block needs one
+
+def _init_decoder(infile):
+    global _block_file
+
+    _block_file = open(infile, "rb")
+
+def _decode_block(offset, text_bits, chars, table):
+    if table not in _block_tables:
+        _block_tables[table] = _read_table(_block_file, table)
+
+    return _read_block(_block_file, _block_tables[table], offset, text_bits, chars)
+
+def _decode_blocks(infile, f, jobs):
+    # decodes a version 3 file using its index, blocks are handed out to a pool of worker processes
+    # workers seek straight to their blocks, the text is yielded in input order
+    tables, blocks = io._read_index(f)
+
+    with _pool(jobs, initializer=_init_decoder, initargs=(infile,)) as pool:
+        # at most 2 blocks per job are in flight, which bounds memory use
+        queue = collections.deque()
+
+        for offset, text_bits, chars, size, table in blocks:
+            queue.append(pool.submit(_decode_block, offset, text_bits, chars, tables[table]))
+
+            if len(queue) >= 2 * jobs:
+                yield _wait_decoded(queue.popleft())
+
+        while queue:
+            yield _wait_decoded(queue.popleft())
+
+def _wait_decoded(future): # text of a block decoded by a worker, the wait is timed as the decode stage
+    with _timer("decode"):
+        text = future.result()
+
+    _count("symbols", len(text))
+    return text
+
+def _decode_text(f, table, length, chunk_size, pad=0, reader=None):
+    # decodes `length` bytes of compressed text from f, chunk_size bytes at a time
+    # the bit reader carries codes split across two chunks
+    reader = reader or io.Bit_reader()
+
+    while True:
+        chunk = _read(f, min(chunk_size, length))
+        length -= len(chunk)
+
+        if length and not chunk:
+            raise ValueError("Error decoding - compressed data is truncated")
+
+        with _timer("decode"):
+            text = reader.decode(table, chunk, final=not length, pad=pad)
+
+        _count("symbols", len(text))
+
+        if text:
+            yield text
+
+        if not length:
+            break
+
+def _decode_stream(f, header, chunk_size):
+    # decodes everything following the header in f
+    if not header.tree: # nothing was compressed
+        return
+
+    table = _decoder(header)
+
+    if header.version != io.VERSION_BLOCKS:
+        yield from _decode_text(f, table, header.length, chunk_size, header.pad, header.reader)
+        return
+
+    # version 3 files are a run of records, blocks use the last table before them
+    while True:
+        tag = f.read(1)
+
+        if not tag:
+            raise ValueError("Error decoding - compressed data is truncated")
+
+        if tag[0] == io.END:
+            break
+
+        elif tag[0] == io.TABLE:
+            with _timer("codes"):
+                table = io.Decode_table(io._get_tree(f.read(io._read_varint_stream(f))))
+
+        elif tag[0] == io.BLOCK:
+            text_bits = io._read_varint_stream(f)
+            length = (text_bits + 7) // 8
+
+            yield from _decode_text(f, table, length, chunk_size, length*8 - text_bits)
+
+        else:
+            raise ValueError(f"Error decoding - unknown record {tag[0]}")
+
+def iter_decompress(infile, chunk_size=DEFAULT_CHUNK_SIZE, table=None):
+    '''
+    yields the decompressed text of a .bin file piece by piece, reading it chunk_size bytes at a time
+    files compressed as raw bytes yield bytes instead
+    memory use doesn't grow with the size of the file, so output can be piped without a temp file
+    '''
+
+    with open(infile, "rb") as f:
+        header = _read_header(f, table)
+
+        if header.flags & io.FLAG_BYTES:
+            yield from (text.encode("latin-1") for text in _decode_stream(f, header, chunk_size))
+        else:
+            yield from _decode_stream(f, header, chunk_size)
+
+def decompress(infile, outfile=None, chunk_size=None, jobs=None, use_mmap=False, table=None):
+    # table is needed for files compressed with a shared table (or the path of its table file), unless it's already been loaded
+    # infile or outfile "-" reads from stdin or writes to stdout, see _decompress_pipe
+    str_mode = outfile == "STRING"
+
+    try:
+        if PIPE in (infile, outfile):
+            return _decompress_pipe(infile, outfile, chunk_size or DEFAULT_CHUNK_SIZE, table)
+
+        if not str_mode:
+            return _decompress_stream(infile, outfile, chunk_size or DEFAULT_CHUNK_SIZE, jobs or 1, use_mmap, table)
+
+        f = BytesIO(io._bits_to_bytes(infile)) # packs the binary string into bytes
+        logger.log("info", "Constructing lookup table")
+
+        header = _read_header(f, table) # decodes tree data, leaving f at the rest of data
+
+        logger.log("info", f"Table constructed; preparing data for decompression")
+
+        if verbose:
+            _display_table(header.tree, header.encoding)
+            
+        # decodes from lookup table
+        uncompressed = "".join(_decode_stream(f, header, len(infile)))
+
+        print("Decompressed data:\n", "="*40, sep="")
+        print(uncompressed, "="*40, sep="\n")
+
+    except:
+        _log_unexpected()
+
+def extract(infile, offset=0, length=None, outfile=None, table=None):
+    '''
+    returns `length` bytes of the decompressed text (utf-8, or the raw bytes of binary files) starting at byte `offset`, or up to the end if length is None
+    a negative offset counts back from the end of the text
+    version 3 files only decode the blocks overlapping the range, found through the index, older files are decoded from the start
+    '''
+
+    str_mode = outfile == "STRING"
+
+    try:
+        logger.log("info", f"Reading header from '{os.path.abspath(infile)}'")
+
+        with open(infile, "rb") as f:
+            header = _read_header(f, table)
+
+            if header.version == io.VERSION_BLOCKS:
+                data = _extract_blocks(f, offset, length, _encoding(header))
+            else:
+                logger.log("warn", "File isn't split into blocks, decompressing from the start")
+                data = _extract_stream(f, header, offset, length)
+
+        if str_mode:
+            print("Extracted data:\n", "="*40, sep="")
+            print(data.decode("utf-8", "replace"), "="*40, sep="\n")
+
+        elif outfile is not None:
+            outfile = _prepare_outfile(infile, outfile, ".txt")
+            logger.log("info", f"Writing to '{os.path.abspath(outfile)}'")
+
+            with open(outfile, "wb+") as out:
+                out.write(data)
+
+        return data
+
+    except Exception:
+        _log_unexpected()
+
+def _extract_blocks(f, offset, length, encoding="utf-8"):
+    # the index gives the utf-8 (or raw) size of every block, so the blocks holding the range are found without decoding anything
+    tables, blocks = io._read_index(f)
+    total = sum(block[3] for block in blocks)
+
+    start = max(total + offset, 0) if offset < 0 else offset
+    stop = total if length is None else min(start + length, total)
+
+    logger.log("info", f"Extracting bytes {start} to {stop} of {total}")
+
+    out = []
+    pos = 0
+    decoders = {} # decode tables by table number
+
+    for block_offset, text_bits, chars, size, table in blocks:
+        if pos >= stop:
+            break
+
+        if pos + size > start:
+            if table not in decoders:
+                decoders[table] = _read_table(f, tables[table])
+
+            data = _read_block(f, decoders[table], block_offset, text_bits, chars).encode(encoding)
+            out.append(data[max(start - pos, 0):stop - pos])
+
+        pos += size
+
+    return b"".join(out)
+
+def _extract_stream(f, header, offset, length):
+    # versions 1 and 2 have no index, so the text is decoded from the start and only the range is kept
+    pieces = (text.encode(_encoding(header)) for text in _decode_stream(f, header, DEFAULT_CHUNK_SIZE))
+
+    if offset < 0: # the end isn't known until everything is decoded, keeps the last -offset bytes
+        tail = b""
+
+        for piece in pieces:
+            tail = (tail + piece)[offset:]
+
+        return tail[:length]
+
+    stop = None if length is None else offset + length
+    out = []
+    pos = 0
+
+    for piece in pieces:
+        if stop is not None and pos >= stop:
+            break
+
+        out.append(piece[max(offset - pos, 0):None if stop is None else stop - pos])
+        pos += len(piece)
+
+    return b"".join(out)
+
+def _decompress_stream(infile, outfile, chunk_size, jobs=1, use_mmap=False, table=None):
+    # decodes the file chunk by chunk and writes the text out as it goes, so memory use stays flat
+    # with jobs > 1 the blocks of a version 3 file are decoded in parallel instead
+    # use_mmap reads the file through a memory map rather than a buffered file, a mmap has the same read/seek methods
+    # off by default, the mapped pages count towards resident memory and reading a chunk at a time is already as fast
+    if verbose:
+        print(f"File size before decompression: ~ {io.formatsize(os.path.getsize(infile))}")
+
+    logger.log("info", f"Reading header from '{os.path.abspath(infile)}'")
+
+    with open(infile, "rb") as raw, (_map_file(raw) if use_mmap else raw) as f:
+        header = _read_header(f, table)
+
+        if jobs > 1 and header.version != io.VERSION_BLOCKS:
+            logger.log("warn", "File isn't split into blocks, decompressing with 1 job")
+            jobs = 1
+
+        if jobs > 1:
+            logger.log("info", f"Table constructed; decompressing blocks with {jobs} jobs")
+        else:
+            logger.log("info", f"Table constructed; decompressing in chunks of {chunk_size} bytes")
+
+        if verbose:
+            _display_table(header.tree, header.encoding)
+
+        binary = header.flags & io.FLAG_BYTES
+        outfile = _prepare_outfile(infile, outfile, "" if binary else ".txt") # binary files get their original name back
+        logger.log("info", f"Writing to '{os.path.abspath(outfile)}'")
+
+        head, tail = "", "" # kept for verbose mode only
+
+        with open(outfile, "wb+" if binary else "w+") as out:
+            for text in _decode_blocks(infile, f, jobs) if jobs > 1 else _decode_stream(f, header, chunk_size):
+                _write(out, text.encode("latin-1") if binary else text)
+
+                if verbose:
+                    head += text[:1001-len(head)]
+                    tail = (tail + text[-500:])[-500:]
+
+    if verbose:
+        print("Raw text:")
+
+        if len(head) <= 1000:
+            print(("="*20)+">", head, ("="*20)+">", sep="\n")
+        else:
+            print(("="*20)+">", head[:500], "\n\t...\n" , tail, ("="*20)+">", sep="\n")
+
+        print(f"File size after decompression: ~ {io.formatsize(os.path.getsize(outfile))}")
+        print(f"Compression ratio: {os.path.getsize(outfile)/os.path.getsize(infile)}")
+
+def _read_pipe(f, size, count=True): # yields up to size bytes at a time from f, a pipe gives what it has rather than waiting for a whole chunk
+    read = getattr(f, "read1", f.read)
+
+    def timed_read(): # like _read
+        with _timer("read"):
+            data = read(size)
+
+        if count:
+            _count("bytes_in", len(data))
+
+        return data
+
+    yield from iter(timed_read, b"")
+
+def _compress_pipe(infile, outfile, binary=False, chunk_size=None, max_code_len=None, adaptive=False, table=None):
+    # compresses from stdin and/or to stdout ("-") with a Compressor, every block is written as soon as it's full
+    # stdin has no extension to tell text from anything else, so it's always compressed as raw bytes
+    compressor = Compressor(chunk_size or DEFAULT_STREAM_BLOCK_SIZE, max_code_len, adaptive, table=table)
+
+    with contextlib.ExitStack() as stack:
+        if infile == PIPE:
+            logger.log("info", "Reading data from stdin")
+            chunks = _read_pipe(sys.stdin.buffer, DEFAULT_CHUNK_SIZE, count=False) # the compressor counts its input
+        else:
+            logger.log("info", f"Reading data from '{os.path.abspath(infile)}'")
+            f = stack.enter_context(open(infile, "rb" if binary else "r"))
+            chunks = iter(lambda: _read(f, DEFAULT_CHUNK_SIZE, count=False), b"" if binary else "")
+
+        if outfile == PIPE:
+            out = sys.stdout.buffer
+        else:
+            outfile = _prepare_outfile(infile, outfile, ".bin")
+            logger.log("info", f"Writing to '{os.path.abspath(outfile)}'")
+            out = stack.enter_context(open(outfile, "wb+"))
+
+        for chunk in chunks:
+            _write(out, compressor.compress(chunk))
+
+        _write(out, compressor.flush())
+        out.flush()
+
+def _decompress_pipe(infile, outfile, chunk_size, table=None):
+    # decompresses from stdin and/or to stdout ("-"), text is written as utf-8
+    # files are read with iter_decompress, which handles every version, stdin goes through a Decompressor (versions 2 and 3)
+    with contextlib.ExitStack() as stack:
+        if outfile == PIPE:
+            out = sys.stdout.buffer
+        else:
+            outfile = _prepare_outfile(infile, outfile, ".txt")
+            logger.log("info", f"Writing to '{os.path.abspath(outfile)}'")
+            out = stack.enter_context(open(outfile, "wb+"))
+
+        if infile != PIPE:
+            logger.log("info", f"Reading data from '{os.path.abspath(infile)}'")
+
+            for text in iter_decompress(infile, chunk_size, table):
+                _write(out, text.encode("utf-8") if isinstance(text, str) else text)
+
+        else:
+            logger.log("info", "Reading data from stdin")
+            decompressor = Decompressor(table)
+
+            for chunk in _read_pipe(sys.stdin.buffer, chunk_size):
+                _write(out, decompressor.decompress(chunk))
+
+                if decompressor.eof:
+                    break
+
+            if not decompressor.eof:
+                raise ValueError("Error decoding - compressed data is truncated")
+
+        out.flush()
+
+class Batch_report:
+    # totals of a compress_dir run
+    def __init__(self):
+        self.compressed = 0 # files
+        self.skipped = 0 # files already up to date
+        self.errors = [] # (path, error message) of every file that couldn't be compressed
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0
+
+    def __str__(self):
+        speed = self.bytes_in / self.seconds if self.seconds else 0
+        ratio = self.bytes_in / self.bytes_out if self.bytes_out else 0
+
+        return (f"Compressed {self.compressed} file(s), {io.formatsize(self.bytes_in)} to {io.formatsize(self.bytes_out)} (ratio {ratio:.3f}) in {self.seconds:.2f}s - "
+                f"{io.formatsize(speed)}/s, {self.compressed / (self.seconds or 1):.0f} files/s; {self.skipped} up to date, {len(self.errors)} failed")
+
+# set in every worker process by _init_batch, so the shared table is only sent once per process
+_batch_table = None
+
+def _init_batch(table):
+    global _batch_table
+
+    _batch_table = _load_table(table) if table is not None else None
+
+def _compress_file(path, outfile, binary=False, max_code_len=None):
+    # compresses one file of a batch, returns (path, bytes read, bytes written, error message or None)
+    # written to a temp file and renamed, so an interrupted batch never leaves a partial .bin behind that looks up to date
+    try:
+        with open(path, "rb" if binary else "r") as f:
+            data = f.read()
+
+        blob = encode(data, max_code_len, table=_batch_table)
+        temp = f"{outfile}.{os.getpid()}.tmp"
+
+        with open(temp, "wb") as f:
+            f.write(blob)
+
+        stat = os.stat(path)
+        os.utime(temp, ns=(stat.st_atime_ns, stat.st_mtime_ns)) # the .bin keeps the source's modification time, see compress_dir
+        os.replace(temp, outfile)
+
+        return path, stat.st_size, len(blob), None
+
+    except Exception as e:
+        return path, 0, 0, f"{type(e).__name__}: {e}"
+
+def compress_dir(source, jobs=None, binary=False, max_code_len=None, table=None, force=False):
+    '''
+    compresses every file under the directory source, each to a .bin next to it named like compress() would
+    files are handed out to a pool of jobs worker processes (every cpu by default) that stay up for the whole batch
+    a .bin is given its source's modification time, files whose .bin has the same one are up to date and skipped unless force is set
+    .bin and .nzt files are never compressed, raises like encode() and returns a Batch_report, files that fail are listed in it
+    '''
+
+    start = time.perf_counter()
+    report = Batch_report()
+    tasks, outfiles = [], set()
+
+    if table is not None:
+        table = _load_table(table)
+        binary = bool(table.flags & io.FLAG_BYTES) # every file has to match what the table was trained on
+
+    for root, dirs, names in os.walk(os.path.abspath(source)):
+        dirs.sort()
+
+        for name in sorted(names):
+            if _is_output(name):
+                continue
+
+            path = os.path.join(root, name)
+            file_binary = binary or os.path.splitext(name)[1] not in [".txt", ".py"]
+            outfile = (path if file_binary else os.path.splitext(path)[0]) + ".bin"
+
+            if outfile in outfiles: # e.g. a.txt and a.py, both would be a.bin
+                report.errors.append((path, f"'{outfile}' is already the destination of another file"))
+                continue
+
+            outfiles.add(outfile)
+
+            if not force and os.path.exists(outfile) and os.stat(outfile).st_mtime_ns == os.stat(path).st_mtime_ns:
+                report.skipped += 1
+                continue
+
+            tasks.append((path, outfile, file_binary, max_code_len))
+
+    jobs = jobs or os.cpu_count() or 1
+
+    if jobs > 1 and len(tasks) > 1:
+        # the table is sent as its file contents, once used it holds an encoder that can't be pickled for spawned workers
+        with _pool(jobs, initializer=_init_batch, initargs=(table.data if table is not None else None,)) as pool:
+            # files are sent in batches, small files would otherwise spend most of their time waiting on the pool
+            results = list(pool.map(_compress_file, *zip(*tasks), chunksize=max(1, min(64, len(tasks) // (4*jobs)))))
+    else:
+        _init_batch(table)
+        results = [_compress_file(*task) for task in tasks]
+
+    for path, bytes_in, bytes_out, error in results:
+        if error is not None:
+            report.errors.append((path, error))
+        else:
+            report.compressed += 1
+            report.bytes_in += bytes_in
+            report.bytes_out += bytes_out
+
+    report.seconds = time.perf_counter() - start
+    return report
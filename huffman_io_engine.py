@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import os.path
-import subprocess
 import sys
 import math
 
@@ -43,143 +42,194 @@ def formatsize(size): # formats bytes into readable format
 
     return f"{round(size)}{sizes[_size]}"
 
-# check if user has bitarray, if not tries to install with pip
-def validate_bitarr():
-    try:
-        import bitarray
-    except:
-        logger.forcelog("warn", "Bitarray module not found. Trying pip")
+#### #### #### #### COMPRESSION #### #### #### ####
+# binary strings are only used for string mode and displaying data, the codecs work on ints
+def _bits_to_bytes(string): # packs a binary string (length divisible by 8) into bytes
+    return int(string, 2).to_bytes(len(string)//8, "big") if string else b""
 
-        try:
-            import pip
-        except:
-            logger.log("fatal", "Pip not found. Run code @ https://bootstrap.pypa.io/get-pip.py")
+def _bytes_to_bits(data): # unpacks bytes into a binary string
+    return format(int.from_bytes(data, "big"), f"0{len(data)*8}b") if data else ""
 
-        logger.forcelog("info", "Pip module found, attempting to download and install bitarray")
-        subprocess.call([sys.executable, "-m", "pip", "install", "bitarray"])
+class Bit_writer:
+    '''
+    packs codes msb first into bytes through an integer accumulator
+    every 64 bits the top of the accumulator is moved out as 8 bytes, so it stays a small int however much is written
+    '''
 
-        try:
-            import bitarray
-            logger.forcelog("info", "Success: bitarray module present")
-            return
-        except:
-            logger.forcelog("info", "Insufficient permissions to install bitarray, attempting administrative install")
-            subprocess.call(["runas", "/user:Administrator", sys.executable, "-m pip install bitarray"])
-        
-    try:
-        import bitarray
-        logger.forcelog("info", "Success: bitarray module present")
-    except:
-        logger.log("fatal", "Unexpected error, bitarray module did not install; exiting.")
+    def __init__(self, acc=0, nbits=0):
+        self.out = bytearray()
+        self.acc = acc
+        self.nbits = nbits
 
-#### #### #### #### COMPRESSION #### #### #### ####
-def _reformat_bin(arr, digits=8): # converts an array of ints to binary
-    arr = list(map(int,arr))
-    out = []
+    def write(self, code, length):
+        self.acc = (self.acc << length) | code
+        self.nbits += length
 
-    for byte in arr:
-        b = ""
+        while self.nbits >= 64:
+            self.nbits -= 64
+            self.out += (self.acc >> self.nbits).to_bytes(8, "big")
+            self.acc &= (1 << self.nbits) - 1
 
-        for i in reversed(range(digits)): # if 2**digits - 1 > byte: data is lost
-            if byte >= 2**i: # checks if binary digit <= the number
-                byte -= 2**i
-                b += "1"
-            else:
-                b += "0"
+    def write_codes(self, string, char_map): # writes the code of every character in string, same as write() inlined
+        out, acc, nbits = self.out, self.acc, self.nbits
+
+        for code, length in map(char_map.__getitem__, string):
+            acc = (acc << length) | code
+            nbits += length
 
-        out.append(b)
+            while nbits >= 64:
+                nbits -= 64
+                out += (acc >> nbits).to_bytes(8, "big")
+                acc &= (1 << nbits) - 1
 
-    return out
+        self.acc, self.nbits = acc, nbits
 
-def _get_encoding(string):
+    def take(self): # returns the whole bytes written so far, the bits of the last partial byte stay in the accumulator
+        whole = self.nbits // 8
+        self.nbits %= 8
+
+        data = bytes(self.out) + (self.acc >> self.nbits).to_bytes(whole, "big")
+        self.acc &= (1 << self.nbits) - 1
+        self.out = bytearray()
+
+        return data
+
+    def flush(self): # returns the rest of the bytes, filling the last one with zero bits
+        if self.nbits % 8:
+            self.write(0, 8 - self.nbits % 8)
+
+        return self.take()
+
+def _pack_codes(string, char_map, acc=0, nbits=0):
     '''
-    0 = ASCII
-    1 = UTF-8
-    2 = UTF-16 (2 bytes)
-    3 = UTF-32 (4 bytes)
-    Unicode Standard 12.1 - 137,929 maximum codes = 3 bytes
+    encodes string after the nbits pending bits in acc
+    returns the whole bytes and the accumulator state holding the bits left over (less than 8)
+    '''
+
+    writer = Bit_writer(acc, nbits)
+    writer.write_codes(string, char_map)
+
+    return writer.take(), writer.acc, writer.nbits
+
+def _write_varint(n): # 7 bits per byte, high bit set on every byte but the last
+    out = bytearray()
 
-    last 2 bits found on every file
+    while n > 0x7f:
+        out.append(0x80 | (n & 0x7f))
+        n >>= 7
+
+    out.append(n)
+    return bytes(out)
+
+def _canonical_codes(lengths):
     '''
-    
-    mode = 0
-    max_bits = [127, 255, 65535, 16777215]#4294967295]
-
-    # finds minimum amount of bytes necessary to display string
-    for c in string:
-        for i,b in enumerate(max_bits):
-            if ord(c) <= b:
-                if mode < i:
-                    mode = i
-                break # updates mode until everything in the string has satisfied the encoding
-
-    return _reformat_bin([mode], digits=2)[0] # reformats the mode (int from 0-3) into 2 bit binary; reformat func returns a list
-
-def _encode_tree(cmap, string_encoding): # encodes the huffman tree data into a binary stream
-    char_bit_length = {
-        "00": 8,  # ASCII
-        "01": 8,  # UTF-8
-        "10": 16, # UTF-16
-        "11": 24  # UTF-32 - currently maximum code only uses 3 bytes, max 4
-    }[string_encoding]
-
-    # amount of different mappings
-    amount_of_chars = _reformat_bin([len(cmap.keys())])[0]
-
-    # the largest length of binary code to represent a character
-    max_len_code_decimal = max(map(len,cmap.values()))
-    max_len_code = _reformat_bin([max_len_code_decimal], digits=6)[0]
-
-    # rounds up to the nearest byte
-    len_code_bytes = max_len_code_decimal//8 + 1
-    
-    # output bytestream
-    tree_bin_data = ""
+    assigns canonical huffman codes from a character to code length mapping
+    codes are handed out in order of (length, code point), each one more than the last and shifted left when the length grows
+    so the lengths alone are enough to rebuild every code
 
+    returns a character to (code, length) mapping
     '''
-    format of each individual entry:
-    1. character bytes (length in bytes determined by char_bit_length)
-    2. data byte, contains info of how many bits to skip whilst reading code byte(s), as there may be uneven amount
-        It is a waste of space, as the max number of bits to skip is 7
-        only if the byte size is dynamic - will have to optimise
-    3. code byte(s) (length determined by max_len_code)
 
-    [char data (1-3 bytes)][read data (1 byte)][code data (any size, scales to size of tree)]
+    cmap = {}
+    code = prev = 0
+
+    for char in sorted(lengths, key=lambda c: (lengths[c], c)):
+        code <<= lengths[char] - prev
+        prev = lengths[char]
+
+        cmap[char] = (code, prev)
+        code += 1
+
+    return cmap
+
+def _encode_tree(cmap): # encodes the code lengths of a canonical lookup table (see huffman_engine for the layout)
+    chars = sorted(cmap)
+    tree_bin_data = bytearray(_write_varint(len(chars)))
+
+    # code points as differences from the previous one, mostly a single byte
+    prev = 0
+    for char in chars:
+        tree_bin_data += _write_varint(ord(char) - prev)
+        prev = ord(char)
+
+    # code lengths as (length, run) pairs
+    runs = []
+    for char in chars:
+        if runs and runs[-1][0] == cmap[char][1]:
+            runs[-1][1] += 1
+        else:
+            runs.append([cmap[char][1], 1])
+
+    for length, run in runs:
+        tree_bin_data += _write_varint(length) + _write_varint(run)
+
+    return bytes(tree_bin_data)
+
+MAGIC = b"NZ\xff" # no version 1 file can start with these bytes
+VERSION = 2
+VERSION_BLOCKS = 3
+
+# header flags
+FLAG_BYTES = 1 # symbols are the raw bytes of the file rather than characters
+FLAG_SHARED = 2 # the table is kept in a separate table file, the header only has its id
+
+TABLE_MAGIC = b"NZT" # start of table files
+TABLE_ID_SIZE = 8
+
+# record tags of version 3 (block) files
+END, TABLE, BLOCK = 0, 1, 2
+
+def _encode_header(cmap, text_bits, flags=0, table_id=None): # everything written before the compressed text
+    if table_id is not None: # shared table, only its id is stored
+        return MAGIC + bytes([VERSION, flags | FLAG_SHARED]) + table_id + _write_varint(text_bits)
+
+    table = _encode_tree(cmap)
+    return MAGIC + bytes([VERSION, flags]) + _write_varint(len(table)) + table + _write_varint(text_bits)
+
+def _encode_table_file(cmap, flags=0): # a shared table on its own, flags says whether it was trained on text or bytes
+    table = _encode_tree(cmap)
+    return TABLE_MAGIC + bytes([flags]) + _write_varint(len(table)) + table
+
+def _table_id(data): # id of the table in a table file, from a hash of its flags and table
+    import hashlib # only needed with shared tables, so it isn't loaded on startup
+    return hashlib.sha256(data[len(TABLE_MAGIC):]).digest()[:TABLE_ID_SIZE]
+
+def _encode_table_record(cmap):
+    table = _encode_tree(cmap)
+    return bytes([TABLE]) + _write_varint(len(table)) + table
+
+def _encode_block_record(data, text_bits):
+    return bytes([BLOCK]) + _write_varint(text_bits) + data
+
+def _encode_index(tables, blocks):
+    '''
+    tables: file offset of every table record
+    blocks: (file offset, compressed bits, characters, uncompressed bytes, table number) of every block record
+    followed by the offset of the index itself as 8 bytes, so it can be found from the end of the file
     '''
-    
-    # loops through lookup table (tree)
-    for char, code in cmap.items():
-        # char bytes
-        # converts char into unicode int and then binary, with a byte length of char_bit_length/8
-        tree_bin_data += _reformat_bin([str(ord(char))], digits=char_bit_length)[0]
-
-        # data byte
-        # finds out amount of digits to skip when reading code bytes
-        _fill_space = (len_code_bytes*8)-len(code)
-        tree_bin_data += _reformat_bin([_fill_space])[0]
-
-        # code bytes
-        # writes literal code generated by huffman tree
-        tree_bin_data += ("0" * _fill_space) + code
-    
-    # returns binary data, other info for debugging and finalising data to be written to file
-    return list(map(int,tree_bin_data)), amount_of_chars, max_len_code
 
-#### #### #### #### DECOMPRESSION #### #### #### ####
-def _bin_to_dec(binary): # converts a binary number (str) into an int
-    current_pow_2 = 0
-    running_sum = 0
+    index = bytearray(_write_varint(len(tables)))
 
-    binary = list(binary)
+    for offset in tables:
+        index += _write_varint(offset)
 
-    while len(binary):
-        running_sum += int(binary.pop()) * (2**current_pow_2)
-        current_pow_2 += 1
+    index += _write_varint(len(blocks))
 
-    return running_sum
+    for block in blocks:
+        for field in block:
+            index += _write_varint(field)
 
-def _get_tree(string, data_bytes): # decodes binary tree data from file data and generates lookup table
-    amount_of_labels, max_len_code, encoding = data_bytes[:8], _bin_to_dec(data_bytes[8:14]), data_bytes[14:]
+    return bytes(index)
+
+#### #### #### #### DECOMPRESSION #### #### #### ####
+def _header_size_v1(data_bytes): # amount of bytes of tree data described by the 2 data bytes
+    amount_of_labels, max_len_code, encoding = data_bytes[0], data_bytes[1] >> 2, data_bytes[1] & 3
+    char_byte_length = [1, 1, 2, 3][encoding]
+
+    return amount_of_labels * (char_byte_length + 1 + max_len_code//8 + 1)
+
+def _get_tree_v1(data, data_bytes): # decodes version 1 binary tree data from the raw file bytes and generates lookup table
+    amount_of_labels, max_len_code, encoding = data_bytes[0], data_bytes[1] >> 2, format(data_bytes[1] & 3, "02b")
     tree = {}
     
     char_byte_length = {
@@ -189,29 +239,333 @@ def _get_tree(string, data_bytes): # decodes binary tree data from file data and
         "11": 3  # UTF-32 - currently maximum code only uses 3 bytes, max 4
     }[encoding]
 
-    # converts bitstream into bytearray: "011010101101000011111101" => ["01101010", "11010000", "11111101"]
-    bytearr = [string[i:i+8] for i in range(0, len(string)-1, 8)]
+    code_bytes_amount = max_len_code//8 + 1
+    pos = 0
 
-    # note that bytearr/string is the tree data as well as the actual compressed text
-    # therefore function returns tree and the rest of the data, which is then decoded
+    # note that data is the tree data as well as the actual compressed text
+    # therefore function returns tree and the offset of the rest of the data, which is then decoded
 
-    for _ in range(_bin_to_dec(amount_of_labels)):
+    for _ in range(amount_of_labels):
         # separates char by known length - set by the encoding before compression
-        char, bytearr = "".join(bytearr[:char_byte_length]), bytearr[char_byte_length:]
-        data_byte = bytearr.pop(0)
-        
-        code_bytes_amount = max_len_code//8 + 1
-        code, bytearr = "".join(bytearr[:code_bytes_amount]), bytearr[code_bytes_amount:]
+        char = int.from_bytes(data[pos:pos+char_byte_length], "big")
+        data_byte = data[pos+char_byte_length]
+        pos += char_byte_length + 1
 
-        # fetch actual code by removing filler bytes
-        code = code[_bin_to_dec(data_byte):]
+        code = int.from_bytes(data[pos:pos+code_bytes_amount], "big")
+        pos += code_bytes_amount
 
-        # map
-        tree[code] = chr(_bin_to_dec(char))
+        # fetch actual code by removing filler bits
+        length = code_bytes_amount*8 - data_byte
+        tree[chr(char)] = (code & ((1 << length) - 1), length)
         
     # returns encoding for verbose mode
-    # sorts tree by longest code first
-    return sorted(tree.items(), key=lambda p: len(p[0]), reverse=True), "".join(bytearr), encoding
+    return tree, pos, encoding
+
+def _skip_filler(data, pos): # skips the filler bits and the set bit marking the start of the compressed text
+    while not data[pos]:
+        pos += 1
+
+    # the remaining bits of the first non-zero byte are already compressed text
+    nbits = data[pos].bit_length() - 1
+    return data[pos] & ((1 << nbits) - 1), nbits, pos + 1
+
+def _read_varint(data, pos): # returns the varint at data[pos] and the position after it
+    n = shift = 0
+
+    while True:
+        byte = data[pos]
+        pos += 1
+
+        n |= (byte & 0x7f) << shift
+        shift += 7
+
+        if byte < 0x80:
+            return n, pos
+
+def _read_varint_stream(f):
+    n = shift = 0
+
+    while True:
+        byte = f.read(1)
+
+        if not byte:
+            raise ValueError("Error decoding - header is truncated")
+
+        n |= (byte[0] & 0x7f) << shift
+        shift += 7
+
+        if byte[0] < 0x80:
+            return n
+
+def _get_tree(table): # decodes the code lengths in a version 2 table and rebuilds the canonical character to (code, length) mapping
+    amount_of_labels, pos = _read_varint(table, 0)
+    chars = []
+
+    prev = 0
+    for _ in range(amount_of_labels):
+        delta, pos = _read_varint(table, pos)
+        prev += delta
+        chars.append(chr(prev))
+
+    lengths = {}
+    while len(lengths) < amount_of_labels:
+        length, pos = _read_varint(table, pos)
+        run, pos = _read_varint(table, pos)
+
+        for char in chars[len(lengths):len(lengths)+run]:
+            lengths[char] = length
+
+    return _canonical_codes(lengths)
+
+class Bin_header:
+    # everything read from the start of a .bin file that's needed to decode the compressed text after it
+    def __init__(self):
+        self.version = VERSION
+        self.flags = 0
+        self.tree = None # character to (code, length) mapping
+        self.table_id = None # id of the shared table, the tree is left for the caller to look up
+        self.encoding = None # version 1 only
+        self.length = 0 # bytes of compressed text
+        self.pad = 0 # zero bits filling the last byte
+        self.reader = Bit_reader() # holds the compressed text bits already read along with the header
+
+def _read_header(f):
+    '''
+    reads the header of an open .bin file, leaving f at the start of the compressed text
+    for version 3 files that's the first table record, leaving f at the first block record
+    '''
+
+    header = Bin_header()
+    start = f.read(len(MAGIC) + 2)
+
+    if start[:len(MAGIC)] != MAGIC: # version 1 files have no magic bytes
+        return _read_header_v1(f, header)
+
+    header.version, header.flags = start[len(MAGIC):]
+
+    if header.version == VERSION_BLOCKS:
+        tag = f.read(1)
+
+        if tag == bytes([END]): # nothing was compressed, the tree is left empty
+            header.tree = {}
+            return header
+
+        if tag != bytes([TABLE]):
+            raise ValueError("Error decoding - block file doesn't start with a table")
+
+        header.tree = _get_tree(f.read(_read_varint_stream(f)))
+        return header
+
+    if header.version != VERSION:
+        raise ValueError(f"Unsupported .bin version {header.version}")
+
+    if header.flags & FLAG_SHARED:
+        header.table_id = f.read(TABLE_ID_SIZE)
+    else:
+        header.tree = _get_tree(f.read(_read_varint_stream(f)))
+
+    text_bits = _read_varint_stream(f)
+    header.length = (text_bits + 7) // 8
+    header.pad = header.length*8 - text_bits
+
+    return header
+
+def _peek_flags(path): # header flags of a .bin file, without reading the rest of the header
+    with open(path, "rb") as f:
+        start = f.read(len(MAGIC) + 2)
+
+    return start[-1] if start[:len(MAGIC)] == MAGIC and len(start) == len(MAGIC) + 2 else 0
+
+def _read_table_file(data): # returns the flags and character to (code, length) mapping of a table file
+    if data[:len(TABLE_MAGIC)] != TABLE_MAGIC:
+        raise ValueError("Not a table file")
+
+    size, pos = _read_varint(data, len(TABLE_MAGIC) + 1)
+    return data[len(TABLE_MAGIC)], _get_tree(data[pos:pos+size])
+
+def _read_index(f): # reads the block index at the end of a version 3 file, returns (table offsets, blocks)
+    f.seek(-8, 2)
+    end = f.tell()
+
+    f.seek(int.from_bytes(f.read(8), "big"))
+    index = f.read(end - f.tell())
+
+    amount, pos = _read_varint(index, 0)
+    tables = []
+
+    for _ in range(amount):
+        offset, pos = _read_varint(index, pos)
+        tables.append(offset)
+
+    amount, pos = _read_varint(index, pos)
+    blocks = []
+
+    for _ in range(amount):
+        block = []
+
+        for _ in range(5):
+            field, pos = _read_varint(index, pos)
+            block.append(field)
+
+        blocks.append(tuple(block))
+
+    return tables, blocks
+
+def _read_header_v1(f, header):
+    header.version = 1
+
+    f.seek(-2, 2)
+    data_bytes = f.read(2) # gets last 2 bytes from data
+    end = f.tell() - 2
+
+    f.seek(0)
+    header.tree, offset, header.encoding = _get_tree_v1(f.read(_header_size_v1(data_bytes)), data_bytes)
+
+    # gets rid of filler bits, which along with the marker span at most 2 bytes
+    start = f.read(min(2, end - offset))
+    acc, nbits, pos = _skip_filler(start, 0)
+
+    header.reader = Bit_reader(acc, nbits)
+    header.reader.feed(start[pos:])
+
+    # amount of compressed bytes left between the header and the data bytes
+    header.length = end - offset - len(start)
+    return header
+
+DECODE_TABLE_BITS = 10
+
+class Decode_table:
+    '''
+    lookup table indexed by the next `bits` bits of the stream
+    each slot holds the decoded char and the length of its code, so every code sharing that prefix decodes in one step
+    codes longer than `bits` share their first level slot with a subtable (length 0) indexed by the next `bits` bits that follow
+    subtables have subtables of their own for codes longer still, so no table has more than 2^bits slots however long the codes get
+    '''
+
+    def __init__(self, tree, bits=DECODE_TABLE_BITS): # tree maps characters to (code, length)
+        self.max_len = max(length for _, length in tree.values())
+        self.bits = min(bits, self.max_len)
+        self.sym = [None] * (1 << self.bits)
+        self.length = [0] * (1 << self.bits)
+
+        overflow = {}
+
+        for char, (code, length) in tree.items():
+            if length <= self.bits:
+                # fills every slot starting with the code, whatever the bits after it are
+                shift = self.bits - length
+                start = code << shift
+
+                for i in range(start, start + (1 << shift)):
+                    self.sym[i] = char
+                    self.length[i] = length
+            else:
+                shift = length - self.bits
+                overflow.setdefault(code >> shift, {})[char] = (code & ((1 << shift) - 1), shift)
+
+        # a subtable sized to its longest suffix would take one lookup, but 2^30 slots for the 40 bit codes of very skewed input
+        for prefix, codes in overflow.items():
+            self.sym[prefix] = Decode_table(codes, bits)
+
+class Bit_reader:
+    '''
+    reads bits msb first through an integer accumulator, the counterpart of Bit_writer
+    compressed text is fed to it a chunk at a time, bits that don't make up a whole code yet are kept for the next chunk
+    '''
+
+    def __init__(self, acc=0, nbits=0):
+        self.acc = acc
+        self.nbits = nbits
+
+    def feed(self, data): # appends data to the bits held
+        self.acc = (self.acc << (8*len(data))) | int.from_bytes(data, "big")
+        self.nbits += 8*len(data)
+
+    def decode(self, table, data, final=True, pad=0): # decodes the bits held followed by data, see _table_decode
+        text, self.acc, self.nbits = _table_decode(table, data, self.acc, self.nbits, final, pad)
+        return text
+
+def _table_decode(table, data, acc=0, nbits=0, final=True, pad=0):
+    '''
+    decodes the bits held in the accumulator followed by the bytes in data
+    acc holds nbits pending bits (msb first), any code is decodable once max_len bits are buffered
+    if final is false, decoding stops when the buffered bits may be an incomplete code so it can resume with the next block
+    if final is true, the last `pad` bits of data are filler and are dropped
+
+    returns the decoded text and the leftover accumulator state
+    '''
+
+    out = []
+    append = out.append
+
+    bits, sym, length, max_len = table.bits, table.sym, table.length, table.max_len
+    mask = (1 << bits) - 1
+    pos, end = 0, len(data)
+
+    if final and not end:
+        acc >>= pad
+        nbits -= pad
+
+    while True:
+        # refills the accumulator 8 bytes at a time
+        if nbits < max_len:
+            if pos < end:
+                chunk = data[pos:pos+8]
+                pos += 8
+
+                acc = (acc << (8*len(chunk))) | int.from_bytes(chunk, "big")
+                nbits += 8*len(chunk)
+
+                if final and pos >= end: # all data is in, drops the filler bits
+                    acc >>= pad
+                    nbits -= pad
+
+                continue
+
+            if not final or not nbits:
+                break
+
+        # peeks the next `bits` bits, padding with zeros at the end of the stream
+        if nbits >= bits:
+            index = (acc >> (nbits-bits)) & mask
+        else:
+            index = (acc << (bits-nbits)) & mask
+
+        n = length[index]
+        char = sym[index]
+
+        if not n: # overflow subtables, each indexed by the bits after the prefix looked up so far
+            used = bits
+
+            while True:
+                if char is None:
+                    raise ValueError("Error decoding - code not found in string")
+
+                sub = char
+                peek = used + sub.bits
+
+                if nbits >= peek:
+                    index = (acc >> (nbits-peek)) & ((1 << sub.bits) - 1)
+                else:
+                    index = (acc << (peek-nbits)) & ((1 << sub.bits) - 1)
+
+                char = sub.sym[index]
+                n = sub.length[index]
+
+                if n:
+                    n += used
+                    break
+
+                used = peek
+
+        if n > nbits:
+            raise ValueError("Error decoding - compressed data is truncated")
+
+        append(char)
+        nbits -= n
+        acc &= (1 << nbits) - 1
+
+    return "".join(out), acc, nbits
 
 def is_bin(string): # checks if string represents binary
     return all(i in "01" for i in string)
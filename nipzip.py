@@ -29,7 +29,9 @@ Options:
 
 import huffman_engine as engine
 import huffman_io_engine as _engine
+import huffman_archive
 from optparse import OptionParser, OptionGroup
+import contextlib
 import os.path
 import sys
 
@@ -37,9 +39,10 @@ engine = type("engine", (), {"main": engine, "helper": _engine})
 
 # basic logger for debugging
 class BasicLogger:
-    def __init__(self, debug=False, logs=[]):
+    def __init__(self, debug=False, logs=[], out=None):
         self.logs = logs
         self.debug = debug
+        self.out = out # stream logs are printed to, stdout if None
 
         self.levels = {
             "fatal": True, # True = die
@@ -57,11 +60,11 @@ class BasicLogger:
         self.logs.append((level, *content))
 
         if self.levels[level.lower()]: # if log is fatal or error will forcelog
-            print("LOGGER."+level.upper()+":", *content)
+            print("LOGGER."+level.upper()+":", *content, file=self.out or sys.stdout)
             sys.exit()
 
         elif self.debug:
-            print("LOGGER."+level.upper()+":", *content)
+            print("LOGGER."+level.upper()+":", *content, file=self.out or sys.stdout)
 
     def forcelog(self, *args):
         self.tmp_debug = self.debug
@@ -71,7 +74,70 @@ class BasicLogger:
 
     def silentlog(self, level, *args): # doesn't raise error
         self.logs.append((level, *args))
-        
+
+# library api, works in memory and raises exceptions instead of logging and exiting
+def compress_bytes(data, max_code_len=None, table=None):
+    '''
+    compresses data and returns the contents of a .bin file
+    str is compressed as text, bytes-like objects as raw bytes
+    '''
+
+    return engine.main.encode(data, max_code_len=max_code_len, table=table)
+
+def decompress_bytes(blob, table=None):
+    '''
+    decompresses the contents of a .bin file
+    returns str for text and bytes for raw bytes
+    '''
+
+    return engine.main.decode(blob, table=table)
+
+def compress_dir(source, jobs=None, binary=False, max_code_len=None, table=None, force=False):
+    '''
+    compresses every file under the directory source in parallel, skipping files that are already up to date
+    returns a report of the files and bytes compressed, files that couldn't be compressed are listed in report.errors
+    '''
+
+    return engine.main.compress_dir(source, jobs, binary, max_code_len, table, force)
+
+def collect(stats=None):
+    '''
+    collects the time spent in every stage of the engine and the bytes and symbols processed inside the with block
+    with nipzip.collect() as stats: ..., then stats.as_dict() or print(stats)
+    '''
+
+    return engine.main.collect(stats)
+
+class Compressor:
+    '''
+    reusable compressor for callers compressing many small pieces of data
+    with a shared table, its encoder and decoder are built once and kept for every call
+    without one, every call builds its own tree like compress_bytes
+    '''
+
+    def __init__(self, table=None, max_code_len=None):
+        # table is a table file made by --train (its path or contents) or a Shared_table
+        self.table = engine.main._load_table(table) if table is not None else None
+        self.max_code_len = max_code_len
+
+    @classmethod
+    def train(cls, samples, binary=False, max_code_len=None):
+        # trains a shared table on samples (str, or bytes-like if binary) without writing a table file
+        return cls(engine.main._train_table(samples, binary, max_code_len), max_code_len)
+
+    def compress(self, data):
+        return engine.main.encode(data, max_code_len=self.max_code_len, table=self.table)
+
+    def decompress(self, blob):
+        return engine.main.decode(blob, table=self.table)
+
+    def compressobj(self, block_size=engine.main.DEFAULT_STREAM_BLOCK_SIZE, adaptive=False):
+        # incremental compressor starting with this table, see huffman_engine.Compressor
+        return engine.main.Compressor(block_size, self.max_code_len, adaptive, table=self.table)
+
+    def decompressobj(self):
+        return engine.main.Decompressor(self.table)
+
 def init_parser(): 
     # help message
     parser = OptionParser("""\
@@ -85,6 +151,10 @@ py nipzip.py [options]
 
     fileopts = OptionGroup(parser, "File Options")
     stringopts = OptionGroup(parser, "String Options")
+    compressopts = OptionGroup(parser, "Compression Options")
+    extractopts = OptionGroup(parser, "Extract Options")
+    tableopts = OptionGroup(parser, "Shared Table Options")
+    archiveopts = OptionGroup(parser, "Archive Options")
     debugopts = OptionGroup(parser, "Debug Options")
 
     stringopts.add_option(
@@ -100,6 +170,85 @@ py nipzip.py [options]
         help="Decodes a string and outputs decompressed string"
     )
 
+    compressopts.add_option(
+        "--max-code-len",
+        type="int",
+        dest="max_code_len",
+        default=None,
+        help="Limits codes to this many bits (e.g. 12, 15, 24), trading a little compression for faster decoding"
+    )
+    compressopts.add_option(
+        "--adaptive",
+        action="store_true",
+        dest="adaptive",
+        default=False,
+        help="Compresses in blocks, giving a block its own code table when the characters used change enough for it to be smaller (e.g. logs mixing JSON, stack traces and base64)"
+    )
+    compressopts.add_option(
+        "-j",
+        "--jobs",
+        type="int",
+        dest="jobs",
+        default=None,
+        help="Compresses or decompresses blocks of the source file in parallel with this many worker processes"
+    )
+
+    extractopts.add_option(
+        "--extract",
+        action="store_true",
+        dest="extract",
+        default=False,
+        help="Decompresses only part of the source file, written to the destination file if provided, otherwise displayed"
+    )
+    extractopts.add_option(
+        "--offset",
+        type="int",
+        dest="offset",
+        default=0,
+        help="Byte of the decompressed text to start extracting from, negative values count back from the end (default: 0)"
+    )
+    extractopts.add_option(
+        "--length",
+        type="int",
+        dest="length",
+        default=None,
+        help="Amount of bytes to extract (default: up to the end)"
+    )
+
+    tableopts.add_option(
+        "--train",
+        action="store_true",
+        dest="train",
+        default=False,
+        help="Builds a shared code table from the source file or directory of sample files and saves it to the destination file (.nzt)"
+    )
+    tableopts.add_option(
+        "--table",
+        dest="table",
+        default=None,
+        help="Compresses or decompresses with a shared table file made by --train, so small files don't each store a table"
+    )
+
+    archiveopts.add_option(
+        "--archive",
+        dest="archive",
+        default=None,
+        help="Archive file (.nza) holding many compressed files - adds the source file or directory to it (creating it if needed), otherwise extracts every member into the destination directory"
+    )
+    archiveopts.add_option(
+        "--list",
+        action="store_true",
+        dest="list",
+        default=False,
+        help="Lists the members of the archive"
+    )
+    archiveopts.add_option(
+        "--member",
+        dest="member",
+        default=None,
+        help="Extracts only this member of the archive, to the destination file if provided, otherwise to stdout"
+    )
+
     debugopts.add_option(
         "-v",
         "--verbose",
@@ -116,6 +265,20 @@ py nipzip.py [options]
         default=False,
         help="Debug mode: display logging info"
     )
+    debugopts.add_option(
+        "--stats",
+        dest="stats",
+        choices=["text", "json"],
+        default=None,
+        help="Prints the time spent in every stage (read, frequency count, tree, codes, header, encode, decode, write) and the bytes and symbols processed to stderr when done, as a table (text) or json"
+    )
+    debugopts.add_option(
+        "--profile",
+        dest="profile",
+        metavar="FILE",
+        default=None,
+        help="Runs the command under cProfile and saves the profile to FILE, to be read with pstats or snakeviz"
+    )
 
     fileopts.add_option(
         "-o",
@@ -128,24 +291,58 @@ py nipzip.py [options]
     fileopts.add_option(
         "--source",
         dest="source",
-        help="Full path to source file (e.g. C:\\Users\\file.txt, ..\\tmp\\binary.bin)"
+        help="Full path to source file (e.g. C:\\Users\\file.txt, ..\\tmp\\binary.bin), or - to read from stdin"
     )
     fileopts.add_option(
         "--dest",
         dest="dest",
-        help="Full path to destination file - if not provided, will create a file with the same name as source file in the same directory"
+        help="Full path to destination file, or - to write to stdout - if not provided, will create a file with the same name as source file in the same directory (stdout when reading from stdin)"
+    )
+    fileopts.add_option(
+        "-b",
+        "--binary",
+        action="store_true",
+        dest="binary",
+        default=False,
+        help="Compresses the raw bytes of the source file, so any kind of file can be compressed (default for files other than .txt and .py) - the destination file keeps the source file's name with .bin added"
+    )
+    fileopts.add_option(
+        "-r",
+        "--recursive",
+        dest="recursive",
+        metavar="DIR",
+        default=None,
+        help="Compresses every file under DIR, each to a .bin next to it, in parallel with --jobs worker processes (default: every cpu) - files whose .bin is up to date are skipped unless -o is given"
+    )
+    fileopts.add_option(
+        "--chunk-size",
+        type="int",
+        dest="chunk_size",
+        default=None,
+        help=f"Processes the source file in chunks instead of reading it whole, keeping memory use flat - compresses into independent blocks of this many characters (default with --jobs: {engine.main.DEFAULT_BLOCK_SIZE}), decompresses reading this many bytes at a time (default: {engine.main.DEFAULT_CHUNK_SIZE})"
     )
     
     parser.add_option_group(fileopts)
     parser.add_option_group(stringopts)
+    parser.add_option_group(compressopts)
+    parser.add_option_group(extractopts)
+    parser.add_option_group(tableopts)
+    parser.add_option_group(archiveopts)
     parser.add_option_group(debugopts)
 
     return parser
 
+def _peek_stdin(size): # first bytes of stdin, left there to be read again
+    stdin = sys.stdin.buffer
+    return stdin.peek(size)[:size] if hasattr(stdin, "peek") else b""
+
 def parse_cmd(argv):
     parser = init_parser()
     opts, args = parser.parse_args()
 
+    return (*_parse_options(opts, args), {"stats": opts.stats, "profile": opts.profile})
+
+def _parse_options(opts, args):
     # fetching options
     verbose = opts.verbose
     debug = opts.debug
@@ -153,12 +350,31 @@ def parse_cmd(argv):
 
     source = opts.source
     dest = opts.dest
+    binary = opts.binary
+    chunk_size = opts.chunk_size
+    max_code_len = opts.max_code_len
+    jobs = opts.jobs
+    adaptive = opts.adaptive
+
+    extract = opts.extract
+    offset = opts.offset
+    length = opts.length
+
+    train = opts.train
+    table = opts.table
+
+    recursive = opts.recursive
+
+    archive = opts.archive
+    listing = opts.list
+    member = opts.member
 
     c_string = opts.text
     d_string = opts.bin
 
     # setting options
-    logger = BasicLogger(debug)
+    pipe = engine.main.PIPE in (source, dest)
+    logger = BasicLogger(debug, out=sys.stderr if pipe else None) # stdout may be carrying the output
     engine.main.logger = logger
     engine.helper.logger = logger
 
@@ -169,13 +385,151 @@ def parse_cmd(argv):
     engine.helper.debug = debug
 
     # validation checks for improper use
-    logger.log("info", "Checking for bitarray module")
-    engine.helper.validate_bitarr()
-    engine.main.safe_import()
-
     for arg in args:
         logger.log("warn", f"'{arg}' is not a valid argument")
 
+    if chunk_size is not None and chunk_size < 1:
+        logger.log("error", "Chunk size must be a positive number of characters")
+
+    if max_code_len is not None and max_code_len < 1:
+        logger.log("error", "Maximum code length must be at least 1 bit")
+
+    if jobs is not None and jobs < 1:
+        logger.log("error", "Must use at least 1 job")
+
+    if length is not None and length < 0:
+        logger.log("error", "Length must not be negative")
+
+    if not extract and (offset or length is not None):
+        logger.log("error", "Offset and length only apply to extraction")
+
+    if table and not os.path.exists(table):
+        logger.log("error", "Table file does not exist - try checking if its the correct full path")
+
+    if table and (chunk_size or jobs or adaptive) and not recursive: # recursive mode runs files in parallel, not blocks
+        logger.log("error", "Shared tables can't be used with chunk size, jobs or adaptive tables")
+
+    if archive:
+        if os.path.splitext(archive)[1] != ".nza":
+            logger.log("error", "Invalid archive file extension")
+
+        if c_string or d_string or extract or train or recursive or chunk_size or jobs or adaptive or binary or max_code_len:
+            logger.log("error", "Archives can't be combined with other modes or options")
+
+        if sum(map(bool, (source, listing, member))) > 1 or not (source or listing or member or dest):
+            logger.log("error", "Archives need one of a source to add, --list, --member or a destination directory")
+
+        if source and not os.path.exists(source):
+            logger.log("error", "Source file does not exist - try checking if its the correct full path")
+
+        if not source and not os.path.exists(archive):
+            logger.log("error", "Archive file does not exist - try checking if its the correct full path")
+
+        if table and not source:
+            logger.log("error", "Shared tables are only used when adding to an archive, the archive stores them")
+
+        if member and dest in (None, engine.main.PIPE): # the member is written to stdout
+            logger.out = sys.stderr
+
+        engine.main.override = override
+        engine.helper.override = override
+
+        return "a", archive, dest, logger, {"source": source, "listing": listing, "member": member, "table": table}
+
+    if recursive:
+        if not os.path.isdir(recursive):
+            logger.log("error", "Recursive mode needs a directory - try checking if its the correct full path")
+
+        if source or dest or c_string or d_string or extract or chunk_size or adaptive or verbose:
+            logger.log("error", "Recursive mode can't be combined with other modes, chunk size, adaptive tables or verbose mode")
+
+        return "r", recursive, None, logger, {"jobs": jobs, "binary": binary, "max_code_len": max_code_len, "table": table, "force": override}
+
+    if train:
+        if not source or not os.path.exists(source):
+            logger.log("error", "Training needs a source file or directory of sample files")
+
+        if c_string or d_string or extract or table or chunk_size or jobs or adaptive:
+            logger.log("error", "Training can't be combined with other modes or options")
+
+        if dest and not os.path.splitext(dest)[1] == ".nzt":
+            logger.log("error", "Invalid destination file extension")
+
+        engine.main.override = override
+        engine.helper.override = override
+
+        options = {"binary": binary or (os.path.isfile(source) and os.path.splitext(source)[1] not in [".txt", ".py"])}
+
+        if max_code_len:
+            options["max_code_len"] = max_code_len
+
+        return "t", source, dest, logger, options
+
+    if extract:
+        if not source or os.path.splitext(source)[1] != ".bin":
+            logger.log("error", "Extraction needs a .bin source file")
+
+        if not os.path.exists(source):
+            logger.log("error", "Source file does not exist - try checking if its the correct full path")
+
+        if c_string or d_string or max_code_len or chunk_size or jobs or binary or adaptive:
+            logger.log("error", "Extraction can't be combined with other modes or options")
+
+        engine.main.override = override
+        engine.helper.override = override
+
+        return "x", source, dest or "STRING", logger, {"offset": offset, "length": length, "table": table}
+
+    # keyword arguments passed on to the engine
+    options = {}
+
+    if table:
+        options["table"] = table
+
+    if max_code_len:
+        options["max_code_len"] = max_code_len
+
+    if pipe:
+        # streams from stdin and/or to stdout through the engine's Compressor/Decompressor
+        engine.main.override = override
+        engine.helper.override = override
+
+        if c_string or d_string:
+            logger.log("error", "Can't provide both string and filename")
+
+        if jobs or verbose:
+            logger.log("error", "Jobs and verbose mode can't be used with stdin or stdout")
+
+        if source != engine.main.PIPE and not os.path.exists(source):
+            logger.log("error", "Source file does not exist - try checking if its the correct full path")
+
+        if source == engine.main.PIPE and dest and dest != engine.main.PIPE and os.path.exists(dest) and not override:
+            # the prompt would read its answer from stdin
+            logger.log("error", "Destination file already exists - use -o to override it when reading from stdin")
+
+        if source == engine.main.PIPE:
+            dest = dest or engine.main.PIPE
+
+            if dest != engine.main.PIPE:
+                decompressing = os.path.splitext(dest)[1] != ".bin"
+            else: # nothing to go by but the data, .bin files start with magic bytes
+                decompressing = _peek_stdin(len(engine.helper.MAGIC)) == engine.helper.MAGIC
+        else:
+            decompressing = os.path.splitext(source)[1] == ".bin" and not binary
+
+        options["chunk_size"] = chunk_size
+
+        if decompressing:
+            if max_code_len or adaptive or binary:
+                logger.log("error", "Maximum code length, adaptive tables and binary mode only apply to compression")
+
+            return "d", source, dest, logger, options
+
+        options["adaptive"] = adaptive
+        options["binary"] = binary or source == engine.main.PIPE or os.path.splitext(source)[1] not in [".txt", ".py"]
+
+        return "c", source, dest, logger, options
+
     if source:
         engine.main.override = override
         engine.helper.override = override
@@ -186,22 +540,34 @@ def parse_cmd(argv):
         if not os.path.exists(source):
             logger.log("error", "Source file does not exist - try checking if its the correct full path")
 
-        if os.path.splitext(source)[1] == ".bin":
-            if dest and not os.path.splitext(dest)[1] == ".txt":
+        options["chunk_size"] = chunk_size
+
+        if os.path.splitext(source)[1] == ".bin" and not binary:
+            # files compressed as raw bytes can be decompressed to any kind of file
+            if not engine.helper._peek_flags(source) & engine.helper.FLAG_BYTES and dest and not os.path.splitext(dest)[1] == ".txt":
                 logger.log("error", "Invalid destination file extension")
 
-            return "d", source, dest, logger
+            if max_code_len or adaptive:
+                logger.log("error", "Maximum code length and adaptive tables only apply to compression")
+
+            options["jobs"] = jobs
+
+            return "d", source, dest, logger, options
         
-        elif os.path.splitext(source)[1] in [".txt", ".py"]:
+        else:
             if dest and not os.path.splitext(dest)[1] == ".bin":
                 logger.log("error", "Invalid destination file extension")
-            
-            return "c", source, dest, logger
 
-        else:
-            logger.log("error", "Error not caught, program exiting")
+            options["jobs"] = jobs
+            options["adaptive"] = adaptive
+            options["binary"] = binary or os.path.splitext(source)[1] not in [".txt", ".py"]
+            
+            return "c", source, dest, logger, options
 
     else:
+        if chunk_size or jobs or binary or adaptive:
+            logger.log("error", "Chunk size, jobs, binary mode and adaptive tables only apply to file mode")
+
         if c_string == d_string == False:
             logger.log("error", "Must include provide source file or string - 'nipzip -h' for help on usage")
 
@@ -209,21 +575,98 @@ def parse_cmd(argv):
             logger.log("error", "Only one mode can be used at a time")
 
         if c_string:
-            return "c", c_string, "STRING", logger
+            return "c", c_string, "STRING", logger, options
 
         elif d_string:
-            return "d", d_string, "STRING", logger
+            if max_code_len:
+                logger.log("error", "Maximum code length only applies to compression")
+
+            return "d", d_string, "STRING", logger, options
+
+def _archive(path, outfile, logger, source=None, listing=False, member=None, table=None):
+    # adds source to the archive at path, lists it, or extracts member (or every member) to outfile
+    try:
+        if source:
+            logger.log("info", f"Adding '{os.path.abspath(source)}' to '{os.path.abspath(path)}'")
+
+            with huffman_archive.Archive(path, "a", table) as archive:
+                names = archive.add(source)
+
+            logger.log("info", f"Added {len(names)} member(s)")
+
+        elif listing:
+            with huffman_archive.Archive(path) as archive:
+                for info in archive:
+                    print(info)
 
-def main(mode, infile, outfile, logger):
+                print(f"{len(archive)} member(s), {_engine.formatsize(sum(info.length for info in archive))} uncompressed")
+
+        elif member:
+            with huffman_archive.Archive(path) as archive:
+                if outfile and outfile != engine.main.PIPE:
+                    outfile = engine.main._prepare_outfile(path, outfile, "")
+                    archive.extract(member, outfile)
+                else:
+                    sys.stdout.buffer.write(archive.read(member))
+                    sys.stdout.flush()
+
+        else:
+            logger.log("info", f"Extracting '{os.path.abspath(path)}' into '{os.path.abspath(outfile)}'")
+
+            with huffman_archive.Archive(path) as archive:
+                archive.extractall(outfile)
+
+    except Exception as e:
+        logger.log("error", f"{type(e).__name__}: {e}")
+
+def main(mode, infile, outfile, logger, options={}, instrument={}):
     logger.log("info", "Command parsed, executing program")
 
-    if not mode in "cd" or not infile or not logger:
+    if not mode in "cdxtra" or not infile or not logger:
         raise NameError("Invalid args for main()")
-    
-    {"c":engine.main.compress,"d":engine.main.decompress}[mode](infile, outfile)
 
-    logger.forcelog("info", f"{'Compression' if mode == 'e' else 'Decompression'} successful, program has exited.")
+    stats, profile = instrument.get("stats"), instrument.get("profile")
+
+    if not stats and not profile:
+        _run(mode, infile, outfile, logger, options)
+    else:
+        with contextlib.ExitStack() as stack:
+            collected = stack.enter_context(engine.main.collect()) if stats else None
+
+            if profile:
+                import cProfile # debug options are imported when they're used, to keep startup quick
+                profiler = cProfile.Profile()
+                stack.callback(profiler.dump_stats, profile)
+                stack.enter_context(profiler)
+
+            _run(mode, infile, outfile, logger, options)
+
+        if stats == "json":
+            import json
+            print(json.dumps(collected.as_dict(), indent=1), file=sys.stderr) # stderr, stdout may be carrying the output
+        elif stats:
+            print(collected, file=sys.stderr)
+
+    action = {"c": "Compression", "d": "Decompression", "x": "Extraction", "t": "Training", "r": "Compression", "a": "Archiving"}[mode]
+    logger.forcelog("info", f"{action} successful, program has exited.")
     sys.exit()
 
+def _run(mode, infile, outfile, logger, options):
+    if mode == "r":
+        report = engine.main.compress_dir(infile, **options)
+
+        for path, error in report.errors:
+            logger.forcelog("warn", f"Couldn't compress '{path}': {error}")
+
+        print(report)
+
+    elif mode == "a":
+        _archive(infile, outfile, logger, **options)
+
+    elif mode == "x":
+        engine.main.extract(infile, outfile=outfile, **options)
+    else:
+        {"c":engine.main.compress,"d":engine.main.decompress,"t":engine.main.train}[mode](infile, outfile, **options)
+
 if __name__ == "__main__":
     main(*parse_cmd(sys.argv))